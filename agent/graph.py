@@ -1,15 +1,27 @@
 """LangGraph workflow for the codebase understanding agent."""
+from typing import Any, Optional
 from langgraph.graph import StateGraph, END
 from agent.state import AgentState
 from agent.nodes.planner import planner_node
 from agent.nodes.retriever import retriever_node
 from agent.nodes.synthesizer import synthesizer_node
 from agent.nodes.verifier import verifier_node
+from agent.nodes.synth_verify import synth_verify_node
 from agent.nodes.finalizer import finalizer_node
 from app.config import settings
 from core.constants import DEFAULT_MAX_RETRIEVAL_ITERATIONS
 
 
+# Resolved once at import so the conditional edge does no per-step lookups
+_MAX_ITERS = getattr(settings, 'max_retrieval_iterations', DEFAULT_MAX_RETRIEVAL_ITERATIONS)
+_FINALIZE = "finalize"
+_RETRIEVE = "retrieve_more"
+
+# Compiled graphs are stateless between invocations, so one per process is enough
+_GRAPH: Optional[Any] = None
+_SIMPLE_GRAPH: Optional[Any] = None
+
+
 def should_retrieve_more(state: AgentState) -> str:
     """
     Determine if we should retrieve more evidence.
@@ -20,23 +32,63 @@ def should_retrieve_more(state: AgentState) -> str:
     Returns:
         Next node name
     """
-    verification = state.get('verification_result', {})
-    iteration = state.get('retrieval_iteration', 0)
-    max_iterations = getattr(settings, 'max_retrieval_iterations', DEFAULT_MAX_RETRIEVAL_ITERATIONS)
-    
-    # Check if verification failed and we haven't exceeded max iterations
-    if not verification.get('is_grounded', True):
-        if iteration < max_iterations:
-            # Check if verifier provided follow-up queries
-            if verification.get('follow_up_queries'):
-                return "retrieve_more"
-    
-    return "finalize"
+    verification = state.get('verification_result')
+    
+    # Retrieve again only if verification failed, the verifier provided
+    # follow-up queries, and we haven't exceeded max iterations
+    if (
+        verification
+        and not verification.get('is_grounded', True)
+        and state.get('retrieval_iteration', 0) < _MAX_ITERS
+        and verification.get('follow_up_queries')
+    ):
+        return _RETRIEVE
+    
+    return _FINALIZE
 
 
 def create_agent_graph():
     """
-    Create the LangGraph workflow for the agent.
+    Get the compiled LangGraph workflow for the agent.
+    
+    The graph is compiled on first use and reused for every question.
+    
+    Returns:
+        Compiled graph
+    """
+    global _GRAPH
+    if _GRAPH is None:
+        _GRAPH = _build_agent_graph()
+    return _GRAPH
+
+
+def create_simple_agent_graph():
+    """
+    Get the compiled graph without the verification loop.
+    Useful for faster responses.
+    
+    Returns:
+        Compiled graph
+    """
+    global _SIMPLE_GRAPH
+    if _SIMPLE_GRAPH is None:
+        _SIMPLE_GRAPH = _build_simple_agent_graph()
+    return _SIMPLE_GRAPH
+
+
+def rebuild_graphs() -> None:
+    """Discard the compiled graphs so the next call recompiles them (e.g. for test isolation)."""
+    global _GRAPH, _SIMPLE_GRAPH
+    _GRAPH = None
+    _SIMPLE_GRAPH = None
+
+
+def _build_agent_graph():
+    """
+    Build and compile the LangGraph workflow for the agent.
+    
+    With settings.fused_synth_verify the synthesizer and verifier are
+    replaced by a single synth_verify node.
     
     Returns:
         Compiled graph
@@ -47,8 +99,6 @@ def create_agent_graph():
     # Add nodes
     workflow.add_node("planner", planner_node)
     workflow.add_node("retriever", retriever_node)
-    workflow.add_node("synthesizer", synthesizer_node)
-    workflow.add_node("verifier", verifier_node)
     workflow.add_node("finalizer", finalizer_node)
     
     # Define the flow
@@ -56,16 +106,26 @@ def create_agent_graph():
     
     # Basic flow
     workflow.add_edge("planner", "retriever")
-    workflow.add_edge("retriever", "synthesizer")
-    workflow.add_edge("synthesizer", "verifier")
+    
+    if settings.fused_synth_verify:
+        # One LLM call answers and verifies
+        workflow.add_node("synth_verify", synth_verify_node)
+        workflow.add_edge("retriever", "synth_verify")
+        verify_node = "synth_verify"
+    else:
+        workflow.add_node("synthesizer", synthesizer_node)
+        workflow.add_node("verifier", verifier_node)
+        workflow.add_edge("retriever", "synthesizer")
+        workflow.add_edge("synthesizer", "verifier")
+        verify_node = "verifier"
     
     # Conditional edge: verify -> retrieve more OR finalize
     workflow.add_conditional_edges(
-        "verifier",
+        verify_node,
         should_retrieve_more,
         {
-            "retrieve_more": "retriever",  # Loop back to retriever
-            "finalize": "finalizer"
+            _RETRIEVE: "retriever",  # Loop back to retriever
+            _FINALIZE: "finalizer"
         }
     )
     
@@ -76,10 +136,9 @@ def create_agent_graph():
     return workflow.compile()
 
 
-def create_simple_agent_graph():
+def _build_simple_agent_graph():
     """
-    Create a simpler version without the verification loop.
-    Useful for faster responses.
+    Build and compile a simpler version without the verification loop.
     
     Returns:
         Compiled graph
@@ -0,0 +1,170 @@
+"""Two-tier (in-memory LRU + SQLite) cache for LLM responses."""
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from app.config import settings
+
+
+class LLMResponseCache:
+    """
+    Cache deterministic LLM responses in memory and on disk.
+
+    The cache is best-effort: SQLite errors (locked or read-only database)
+    are logged and the call proceeds as a cache miss, so caching can never
+    fail an LLM call that already succeeded.
+    """
+
+    def __init__(self, db_path: Path = None, max_memory_entries: int = None, max_disk_entries: int = None):
+        """
+        Initialize the response cache.
+
+        Args:
+            db_path: Path to SQLite database for the persistent tier
+            max_memory_entries: Maximum entries kept in the in-memory LRU
+            max_disk_entries: Maximum entries kept in the SQLite tier
+        """
+        self.db_path = db_path or settings.llm_cache_path
+        self.max_memory_entries = max_memory_entries or settings.llm_cache_size
+        self.max_disk_entries = max_disk_entries or settings.llm_cache_disk_size
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_enabled = True
+
+        try:
+            self._init_database()
+        except sqlite3.Error as e:
+            print(f"LLM cache disk tier disabled: {e}")
+            self._disk_enabled = False
+
+    def _init_database(self):
+        """Initialize database schema."""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get a database connection."""
+        return sqlite3.connect(str(self.db_path), timeout=1.0)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached content or None
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        if not self._disk_enabled:
+            return None
+
+        try:
+            conn = self._get_connection()
+            try:
+                row = conn.execute(
+                    "SELECT content FROM llm_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"LLM cache read failed: {e}")
+            return None
+
+        if row:
+            self._remember(key, row[0])
+            return row[0]
+
+        return None
+
+    def set(self, key: str, content: str) -> None:
+        """
+        Store a response in both cache tiers.
+
+        The disk tier keeps only the most recently stored max_disk_entries
+        responses.
+
+        Args:
+            key: Cache key
+            content: Response content
+        """
+        self._remember(key, content)
+
+        if not self._disk_enabled:
+            return
+
+        try:
+            conn = self._get_connection()
+            try:
+                # REPLACE assigns a fresh rowid, so rowid order is insertion order
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (cache_key, content) VALUES (?, ?)",
+                    (key, content)
+                )
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE rowid <= (SELECT MAX(rowid) FROM llm_cache) - ?",
+                    (self.max_disk_entries,)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"LLM cache write failed: {e}")
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        with self._lock:
+            self._memory.clear()
+
+        if not self._disk_enabled:
+            return
+
+        try:
+            conn = self._get_connection()
+            try:
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"LLM cache clear failed: {e}")
+
+    def _remember(self, key: str, content: str) -> None:
+        """Insert into the in-memory tier, evicting the least recently used entry."""
+        with self._lock:
+            self._memory[key] = content
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+
+# Global instance
+_llm_cache = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Get or create the global LLM response cache instance."""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
+
+
+def clear_llm_cache() -> None:
+    """Clear cached LLM responses (call after a repository is re-indexed or deleted)."""
+    get_llm_cache().clear()
@@ -1,11 +1,75 @@
 """LLM wrapper for Hugging Face models."""
-from typing import Optional, List, Any
+from functools import lru_cache
+from typing import Optional, List, Any, Iterable, Iterator
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+from pydantic import PrivateAttr
+from requests.adapters import HTTPAdapter
 import requests
+import hashlib
 import json
+import threading
+from agent.llm_cache import get_llm_cache
+from app.config import settings
+
+
+def _create_session() -> requests.Session:
+    """Create a pooled HTTP session shared by all LLM instances."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings.hf_pool_connections,
+        pool_maxsize=settings.hf_pool_maxsize
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared session so keep-alive connections are reused across LLM calls
+_SESSION = _create_session()
+
+# Cache keys of deterministic requests currently being generated. Concurrent
+# identical requests wait for the first one instead of calling the API again.
+_IN_FLIGHT = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+_IN_FLIGHT_WAIT_SECONDS = 125  # Slightly longer than the request timeout
+
+
+def _iter_sse_deltas(lines: Iterable[bytes]) -> Iterator[str]:
+    """
+    Extract content deltas from server-sent event lines.
+    
+    Lines are decoded as UTF-8 explicitly; event-stream responses often omit
+    a charset, in which case requests would fall back to ISO-8859-1.
+    
+    Args:
+        lines: Raw response lines
+    
+    Yields:
+        Non-empty `choices[0].delta.content` values until `[DONE]`
+    """
+    for raw_line in lines:
+        line = raw_line.decode("utf-8", errors="replace") if isinstance(raw_line, bytes) else raw_line
+        if not line.startswith("data:"):
+            continue
+        
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        
+        choices = event.get("choices") or []
+        if not choices:
+            continue
+        
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
 
 
 class HuggingFaceChatLLM(BaseChatModel):
@@ -17,6 +81,8 @@ class HuggingFaceChatLLM(BaseChatModel):
     max_tokens: Optional[int] = None
     base_url: str = "https://router.huggingface.co/v1/chat/completions"
     
+    _headers: dict = PrivateAttr(default_factory=dict)
+    
     def __init__(self, model: str = None, huggingface_api_key: str = None, model_name: str = None, api_key: str = None, temperature: float = 0.0, **kwargs):
         # Support both naming conventions - map to Pydantic field names
         final_model = model or model_name
@@ -29,6 +95,12 @@ class HuggingFaceChatLLM(BaseChatModel):
         
         # Pass to Pydantic with correct field names
         super().__init__(model_name=final_model, api_key=final_api_key, temperature=temperature, **kwargs)
+        
+        # Build request headers once instead of on every call
+        self._headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
     
     @property
     def _llm_type(self) -> str:
@@ -39,40 +111,56 @@ class HuggingFaceChatLLM(BaseChatModel):
         messages: List[BaseMessage],
         stop: Optional[List[str]] = None,
         run_manager: Optional[CallbackManagerForLLMRun] = None,
+        cache: bool = True,
         **kwargs: Any,
     ) -> ChatResult:
-        """Generate a response from Hugging Face API."""
-        # Convert LangChain messages to OpenAI format
-        formatted_messages = []
-        for msg in messages:
-            if isinstance(msg, SystemMessage):
-                formatted_messages.append({"role": "system", "content": msg.content})
-            elif isinstance(msg, HumanMessage):
-                formatted_messages.append({"role": "user", "content": msg.content})
-            elif isinstance(msg, AIMessage):
-                formatted_messages.append({"role": "assistant", "content": msg.content})
+        """
+        Generate a response from Hugging Face API.
         
-        # Prepare request
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        Deterministic (temperature 0) responses are served from the LLM
+        response cache when available, and concurrent identical requests
+        share a single API call. Pass cache=False to force a fresh call.
+        """
+        formatted_messages = self._format_messages(messages)
+        payload = self._build_payload(formatted_messages)
         
-        payload = {
-            "model": self.model_name,
-            "messages": formatted_messages,
-            "temperature": self.temperature,
-        }
+        # Only cache deterministic generations
+        cache_key = self._lookup_key(formatted_messages, stop, cache)
+        if not cache_key:
+            return self._request_completion(payload, cache_key)
         
-        if self.max_tokens:
-            payload["max_tokens"] = self.max_tokens
+        cached_content = get_llm_cache().get(cache_key)
+        if cached_content is not None:
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=cached_content))])
+        
+        with _IN_FLIGHT_LOCK:
+            in_flight = _IN_FLIGHT.get(cache_key)
+            if in_flight is None:
+                _IN_FLIGHT[cache_key] = threading.Event()
         
+        if in_flight is not None:
+            # Another thread is generating this exact response; reuse it once
+            # cached. If that call failed (errors are not cached), call ourselves.
+            in_flight.wait(_IN_FLIGHT_WAIT_SECONDS)
+            cached_content = get_llm_cache().get(cache_key)
+            if cached_content is not None:
+                return ChatResult(generations=[ChatGeneration(message=AIMessage(content=cached_content))])
+            return self._request_completion(payload, cache_key)
+        
+        try:
+            return self._request_completion(payload, cache_key)
+        finally:
+            with _IN_FLIGHT_LOCK:
+                _IN_FLIGHT.pop(cache_key).set()
+    
+    def _request_completion(self, payload: dict, cache_key: Optional[str]) -> ChatResult:
+        """Call the chat completions API, caching well-formed responses under cache_key."""
         try:
-            response = requests.post(
+            response = _SESSION.post(
                 self.base_url,
-                headers=headers,
+                headers=self._headers,
                 json=payload,
-                timeout=120
+                timeout=(5, 120)
             )
             response.raise_for_status()
             
@@ -81,6 +169,10 @@ class HuggingFaceChatLLM(BaseChatModel):
             # Extract content from response
             if "choices" in result and len(result["choices"]) > 0:
                 content = result["choices"][0]["message"]["content"]
+                
+                # Only well-formed completions are cached
+                if cache_key:
+                    get_llm_cache().set(cache_key, content)
             else:
                 # Fallback for different response formats
                 content = result.get("generated_text", str(result))
@@ -91,35 +183,166 @@ class HuggingFaceChatLLM(BaseChatModel):
             
             return ChatResult(generations=[generation])
             
-        except requests.exceptions.HTTPError as e:
-            error_msg = f"Hugging Face API error: {str(e)}"
-            if hasattr(e, 'response') and e.response is not None:
-                try:
-                    error_detail = e.response.json()
-                    error_msg += f" - {error_detail}"
-                    
-                    # Check for model not supported error
-                    if isinstance(error_detail, dict):
-                        error_info = error_detail.get('error', {})
-                        if isinstance(error_info, dict) and 'model_not_supported' in str(error_info):
-                            error_msg += "\n\n💡 Tip: The model may not be available on the router API. "
-                            error_msg += "Try updating the model in your .env file to a supported model like: "
-                            error_msg += "meta-llama/Llama-3.2-3B-Instruct or google/gemma-2-2b-it"
-                except:
-                    error_msg += f" - Status: {e.response.status_code}"
-            
+        except requests.exceptions.RequestException as e:
             # Return error as message
-            message = AIMessage(content=f"Error: {error_msg}")
+            message = AIMessage(content=f"Error: {self._format_error(e)}")
             generation = ChatGeneration(message=message)
             return ChatResult(generations=[generation])
+    
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        cache: bool = True,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        """
+        Stream a response from Hugging Face API using server-sent events.
+        
+        Each `data: {...}` frame carries a token delta which is yielded as
+        soon as it arrives. The assembled response is stored in the LLM
+        response cache, and cached responses are replayed as a single chunk.
+        """
+        formatted_messages = self._format_messages(messages)
+        payload = self._build_payload(formatted_messages)
+        payload["stream"] = True
+        
+        cache_key = self._lookup_key(formatted_messages, stop, cache)
+        if cache_key:
+            cached_content = get_llm_cache().get(cache_key)
+            if cached_content is not None:
+                yield self._emit_chunk(cached_content, run_manager)
+                return
+        
+        parts = []
+        try:
+            with _SESSION.post(
+                self.base_url,
+                headers=self._headers,
+                json=payload,
+                stream=True,
+                timeout=(5, 120)
+            ) as response:
+                response.raise_for_status()
+                
+                for delta in _iter_sse_deltas(response.iter_lines()):
+                    parts.append(delta)
+                    yield self._emit_chunk(delta, run_manager)
             
         except requests.exceptions.RequestException as e:
-            error_msg = f"Hugging Face API error: {str(e)}"
-            message = AIMessage(content=f"Error: {error_msg}")
-            generation = ChatGeneration(message=message)
-            return ChatResult(generations=[generation])
+            if parts:
+                # Don't splice an error message into a partially streamed answer
+                print(f"Hugging Face stream interrupted after {len(parts)} chunks: {e}")
+                raise
+            yield self._emit_chunk(f"Error: {self._format_error(e)}", run_manager)
+            return
+        
+        if cache_key and parts:
+            get_llm_cache().set(cache_key, "".join(parts))
+    
+    @staticmethod
+    def _emit_chunk(content: str, run_manager: Optional[CallbackManagerForLLMRun]) -> ChatGenerationChunk:
+        """Wrap a token delta in a generation chunk and notify callbacks."""
+        chunk = ChatGenerationChunk(message=AIMessageChunk(content=content))
+        if run_manager:
+            run_manager.on_llm_new_token(content, chunk=chunk)
+        return chunk
+    
+    @staticmethod
+    def _format_messages(messages: List[BaseMessage]) -> List[dict]:
+        """Convert LangChain messages to OpenAI format."""
+        formatted_messages = []
+        for msg in messages:
+            if isinstance(msg, SystemMessage):
+                formatted_messages.append({"role": "system", "content": msg.content})
+            elif isinstance(msg, HumanMessage):
+                formatted_messages.append({"role": "user", "content": msg.content})
+            elif isinstance(msg, AIMessage):
+                formatted_messages.append({"role": "assistant", "content": msg.content})
+        return formatted_messages
+    
+    def _build_payload(self, formatted_messages: List[dict]) -> dict:
+        """Prepare the chat completions request body."""
+        payload = {
+            "model": self.model_name,
+            "messages": formatted_messages,
+            "temperature": self.temperature,
+        }
+        
+        if self.max_tokens:
+            payload["max_tokens"] = self.max_tokens
+        
+        return payload
+    
+    def _lookup_key(self, formatted_messages: List[dict], stop: Optional[List[str]], cache: bool) -> Optional[str]:
+        """Return the cache key for a request, or None if it should not be cached."""
+        if cache and settings.llm_cache_enabled and self.temperature == 0:
+            return self._cache_key(formatted_messages, stop)
+        return None
+    
+    @staticmethod
+    def _format_error(e: requests.exceptions.RequestException) -> str:
+        """Build a readable error message from a failed API request."""
+        error_msg = f"Hugging Face API error: {str(e)}"
+        if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+            try:
+                error_detail = e.response.json()
+                error_msg += f" - {error_detail}"
+                
+                # Check for model not supported error
+                if isinstance(error_detail, dict):
+                    error_info = error_detail.get('error', {})
+                    if isinstance(error_info, dict) and 'model_not_supported' in str(error_info):
+                        error_msg += "\n\n💡 Tip: The model may not be available on the router API. "
+                        error_msg += "Try updating the model in your .env file to a supported model like: "
+                        error_msg += "meta-llama/Llama-3.2-3B-Instruct or google/gemma-2-2b-it"
+            except:
+                error_msg += f" - Status: {e.response.status_code}"
+        return error_msg
+    
+    def _cache_key(self, formatted_messages: List[dict], stop: Optional[List[str]]) -> str:
+        """Build a stable cache key for a request."""
+        key_data = json.dumps({
+            "m": self.model_name,
+            "t": self.temperature,
+            "mt": self.max_tokens,
+            "s": stop,
+            "msgs": formatted_messages
+        }, sort_keys=True)
+        return hashlib.blake2b(key_data.encode(), digest_size=16).hexdigest()
+    
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Clear all cached LLM responses."""
+        get_llm_cache().clear()
+
+
+@lru_cache(maxsize=8)
+def get_hf_chat(
+    model: str,
+    api_key: str,
+    temperature: float = 0.0,
+    max_tokens: Optional[int] = None
+) -> HuggingFaceChatLLM:
+    """
+    Get a shared chat model instance for the given configuration.
+    
+    Instances hold no per-request state, so they are safe to reuse
+    across planner, synthesizer, and verifier calls.
+    
+    Args:
+        model: Model name
+        api_key: Hugging Face API key
+        temperature: Temperature for generation
+        max_tokens: Optional maximum tokens to generate
     
-    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
-        """Streaming not implemented yet."""
-        result = self._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
-        yield result.generations[0]
+    Returns:
+        Cached HuggingFaceChatLLM instance
+    """
+    return HuggingFaceChatLLM(
+        model=model,
+        huggingface_api_key=api_key,
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
@@ -32,15 +32,11 @@ def finalizer_node(state: AgentState) -> AgentState:
         include_code_snippets=True
     )
     
-    reasoning_trace = state.get('reasoning_trace', [])
-    reasoning_trace.append(
-        f"Finalized answer with {len(enhanced_citations)} citations "
-        f"(summary, code snippets, and formatted references)"
-    )
-    
     return {
-        **state,
         'final_answer': final_answer,
         'citations': enhanced_citations,
-        'reasoning_trace': reasoning_trace
+        'reasoning_trace': [
+            f"Finalized answer with {len(enhanced_citations)} citations "
+            f"(summary, code snippets, and formatted references)"
+        ]
     }
@@ -1,6 +1,6 @@
 """Planner node for the agent."""
 from agent.state import AgentState
-from agent.prompts import get_planner_prompt, extract_json_from_response
+from agent.prompts import get_planner_prompt, parse_model_response, Plan, DEFAULT_PLAN_REASONING, PLANNER_INSTRUCTIONS
 from core.llm_service import LLMServiceFactory
 from core.error_handler import safe_execute
 
@@ -26,31 +26,25 @@ def planner_node(state: AgentState) -> AgentState:
         default_return=_create_fallback_plan(state['question'])
     )
     
-    reasoning_trace = state.get('reasoning_trace', [])
-    reasoning_trace.append(f"Plan: {plan['reasoning']}")
-    
     return {
-        **state,
         'plan': plan,
-        'reasoning_trace': reasoning_trace,
+        'reasoning_trace': [f"Plan: {plan['reasoning']}"],
         'retrieval_iteration': 0
     }
 
 
 def _generate_plan(llm_service, prompt: str, question: str) -> dict:
     """Generate a plan using the LLM service."""
-    response_text = llm_service.invoke_text(prompt)
-    plan = extract_json_from_response(response_text)
+    response_text = llm_service.invoke_text(prompt, PLANNER_INSTRUCTIONS)
+    plan = parse_model_response(response_text, Plan)
     
-    # Validate plan has required fields
-    if not plan.get('search_queries'):
-        plan['search_queries'] = [question]
-    if not plan.get('reasoning'):
-        plan['reasoning'] = "Direct search for question keywords"
-    if not plan.get('expected_files'):
-        plan['expected_files'] = []
+    # Empty values from the model fall back to defaults
+    if not plan.search_queries:
+        plan.search_queries = [question]
+    if not plan.reasoning:
+        plan.reasoning = DEFAULT_PLAN_REASONING
     
-    return plan
+    return plan.model_dump()
 
 
 def _create_fallback_plan(question: str) -> dict:
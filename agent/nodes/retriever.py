@@ -1,10 +1,18 @@
 """Retriever node for the agent."""
+import heapq
+import re
+import sys
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor
 from agent.state import AgentState
 from tools.retrieval_tools import hybrid_search, merge_and_rerank
 from core.constants import (
     DEFAULT_MAX_CHUNKS_PER_QUERY, 
     DEFAULT_MAX_CITATIONS,
-    DEFAULT_QUERY_VARIATIONS
+    DEFAULT_QUERY_VARIATIONS,
+    MAX_QUERY_VARIATIONS,
+    MIN_LLM_VARIATION_WORDS,
+    MIN_PLANNED_QUERIES
 )
 from core.query_variation import (
     generate_query_variations,
@@ -13,6 +21,76 @@ from core.query_variation import (
 from app.config import settings
 
 
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_FLAT_CHUNK_FIELDS = ('file_path', 'start_line', 'end_line', 'symbol_name')
+
+
+def _score(chunk: dict) -> float:
+    """Ranking score of a retrieved chunk."""
+    return chunk.get('combined_score', chunk.get('score', 0.0))
+
+
+def _normalize_chunk(chunk: dict) -> None:
+    """
+    Give a search result flat location and text fields, in place.
+    
+    Vector results nest file_path, start_line, end_line and symbol_name
+    under 'metadata' while lexical results are flat and carry 'chunk_text'.
+    Lifting them to the top level once lets every later consumer (prompts,
+    context optimizer, citations) read each field with a single lookup.
+    Existing keys, including 'metadata', are left untouched.
+    
+    The file path is also interned: many chunks (and the citations
+    extracted against them) share a path, and interning keeps one copy and
+    lets set and dict lookups short-circuit on identity.
+    """
+    metadata = chunk.get('metadata') or {}
+    for field in _FLAT_CHUNK_FIELDS:
+        if field not in chunk and field in metadata:
+            chunk[field] = metadata[field]
+    if 'text' not in chunk:
+        chunk['text'] = chunk.get('chunk_text', '')
+    if isinstance(chunk.get('file_path'), str):
+        chunk['file_path'] = sys.intern(chunk['file_path'])
+
+
+def _select_top_chunks(chunks: list) -> list:
+    """
+    Keep the highest-scoring chunks, ordered by score.
+    
+    A strong chunk found in a later iteration can displace a weak earlier
+    one, and the synthesizer always sees chunks in score order.
+    
+    Args:
+        chunks: Existing and newly retrieved chunks
+    
+    Returns:
+        At most DEFAULT_MAX_CITATIONS chunks, highest score first
+    """
+    return heapq.nlargest(DEFAULT_MAX_CITATIONS, chunks, key=_score)
+
+
+def _search_all(queries: list, repo_id: str) -> list:
+    """
+    Run hybrid search for each query concurrently.
+    
+    Args:
+        queries: List of queries
+        repo_id: Repository ID
+    
+    Returns:
+        List of (query, chunks) pairs in the original query order
+    """
+    if not queries:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(settings.max_search_workers, len(queries))) as executor:
+        return list(executor.map(
+            lambda q: (q, hybrid_search(q, repo_id, k=DEFAULT_MAX_CHUNKS_PER_QUERY)),
+            queries
+        ))
+
+
 def retriever_node(state: AgentState) -> AgentState:
     """
     Retrieve relevant code chunks using multi-query retrieval.
@@ -30,15 +108,24 @@ def retriever_node(state: AgentState) -> AgentState:
     # Determine base queries based on iteration
     base_queries = _get_queries_for_iteration(state, retrieval_iteration)
     
-    # Generate query variations for multi-query retrieval
-    all_queries = []
-    for base_query in base_queries:
-        variations = generate_query_variations(
+    # Generate query variations for multi-query retrieval. LLM rewriting is
+    # only worth a call on the first pass for a single, descriptive query;
+    # otherwise the planner or verifier queries already provide diversity.
+    use_llm = (
+        retrieval_iteration == 1
+        and 0 < len(base_queries) < MIN_PLANNED_QUERIES
+        and len(base_queries[0].split()) >= MIN_LLM_VARIATION_WORDS
+    )
+    
+    # One group of variations per base query
+    query_groups = [
+        generate_query_variations(
             base_query,
             num_variations=getattr(settings, 'query_variations', DEFAULT_QUERY_VARIATIONS),
-            use_llm=True
+            use_llm=use_llm
         )
-        all_queries.extend(variations)
+        for base_query in base_queries
+    ]
     
     # For follow-up iterations, also use query rewriting based on previous results
     if retrieval_iteration > 1:
@@ -50,43 +137,72 @@ def retriever_node(state: AgentState) -> AgentState:
                 state['question'],
                 max_new_queries=3
             )
-            all_queries.extend(rewritten_queries)
+            query_groups.append(rewritten_queries)
+    
+    # Remove near-duplicate queries and bound fan-out without dropping any group
+    unique_queries = _dedupe_queries(query_groups)
     
-    # Remove duplicates while preserving order
-    seen_queries = set()
-    unique_queries = []
-    for q in all_queries:
-        q_lower = q.lower().strip()
-        if q_lower and q_lower not in seen_queries:
-            seen_queries.add(q_lower)
-            unique_queries.append(q)
+    # Reuse the chunk ID set carried in state instead of rebuilding it
+    existing_chunks = state.get('retrieved_chunks', [])
+    existing_chunk_ids = state.get('retrieved_chunk_ids')
+    if existing_chunk_ids is None:
+        existing_chunk_ids = {chunk['chunk_id'] for chunk in existing_chunks}
     
     # Retrieve chunks for all query variations
     all_chunks = _retrieve_with_multi_query(
         unique_queries,
         state['repo_id'],
-        state.get('retrieved_chunks', []),
+        existing_chunk_ids,
         state['question']
     )
     
-    # Combine with existing chunks and limit
-    combined_chunks = state.get('retrieved_chunks', []) + all_chunks
-    combined_chunks = combined_chunks[:DEFAULT_MAX_CITATIONS]
-    
-    reasoning_trace = state.get('reasoning_trace', [])
-    reasoning_trace.append(
-        f"Iteration {retrieval_iteration}: Used {len(unique_queries)} query variations, "
-        f"retrieved {len(all_chunks)} new chunks ({len(combined_chunks)} total)"
-    )
+    # Combine with existing chunks and keep the highest-scoring ones
+    combined_chunks = _select_top_chunks(existing_chunks + all_chunks)
+    if len(existing_chunks) + len(all_chunks) > DEFAULT_MAX_CITATIONS:
+        # Dropped chunks may be retrieved again in a later iteration
+        retrieved_chunk_ids = {chunk['chunk_id'] for chunk in combined_chunks}
+    else:
+        retrieved_chunk_ids = existing_chunk_ids | {chunk['chunk_id'] for chunk in all_chunks}
     
     return {
-        **state,
         'retrieved_chunks': combined_chunks,
+        'retrieved_chunk_ids': retrieved_chunk_ids,
         'retrieval_iteration': retrieval_iteration,
-        'reasoning_trace': reasoning_trace
+        'reasoning_trace': [
+            f"Iteration {retrieval_iteration}: Used {len(unique_queries)} query variations, "
+            f"retrieved {len(all_chunks)} new chunks ({len(combined_chunks)} total)"
+        ]
     }
 
 
+def _dedupe_queries(query_groups: list) -> list:
+    """
+    Interleave query groups and deduplicate them by a canonical key
+    (collapsed whitespace, casefolded, trailing punctuation stripped).
+    
+    Groups are taken round-robin (first query of every group, then the
+    second, ...), so the MAX_QUERY_VARIATIONS cap trims variations evenly
+    instead of dropping whole base queries or the rewritten queries.
+    
+    Args:
+        query_groups: Lists of candidate queries, one per base query
+    
+    Returns:
+        Unique queries, at most MAX_QUERY_VARIATIONS of them
+    """
+    unique = {}
+    for queries in zip_longest(*query_groups):
+        for q in queries:
+            if q is None:
+                continue
+            key = _WHITESPACE_PATTERN.sub(" ", q).strip().casefold().rstrip("?.!,")
+            if key and key not in unique:
+                unique[key] = q
+                if len(unique) >= MAX_QUERY_VARIATIONS:
+                    return list(unique.values())
+    return list(unique.values())
+
+
 def _get_queries_for_iteration(state: AgentState, iteration: int) -> list:
     """Get queries for the current retrieval iteration."""
     if iteration == 1:
@@ -107,7 +223,7 @@ def _get_queries_for_iteration(state: AgentState, iteration: int) -> list:
 def _retrieve_with_multi_query(
     queries: list,
     repo_id: str,
-    existing_chunks: list,
+    existing_chunk_ids: set,
     original_question: str = None
 ) -> list:
     """
@@ -119,76 +235,67 @@ def _retrieve_with_multi_query(
     Args:
         queries: List of query variations
         repo_id: Repository ID
-        existing_chunks: Already retrieved chunks (to avoid duplicates)
+        existing_chunk_ids: IDs of already retrieved chunks (to avoid duplicates)
         original_question: Original question for reranking context
     
     Returns:
         List of new, deduplicated chunks
     """
-    existing_chunk_ids = {
-        chunk['chunk_id'] 
-        for chunk in existing_chunks
-    }
-    
     # Collect results from all queries
     all_results = []
     query_results_map = {}  # Track which query found which chunks
     
-    for query in queries:
-        chunks = hybrid_search(query, repo_id, k=DEFAULT_MAX_CHUNKS_PER_QUERY)
-        
+    # Searches run concurrently; bookkeeping below stays single-threaded
+    for query, chunks in _search_all(queries, repo_id):
         # Track source query for each chunk
         for chunk in chunks:
             chunk_id = chunk['chunk_id']
-            if chunk_id not in existing_chunk_ids:
+            if chunk_id in existing_chunk_ids:
+                continue
+            
+            existing_chunk = query_results_map.get(chunk_id)
+            if existing_chunk is None:
+                _normalize_chunk(chunk)
                 # Add query as metadata for tracking
-                if 'sources' not in chunk:
-                    chunk['sources'] = []
-                if 'query_sources' not in chunk:
-                    chunk['query_sources'] = []
-                chunk['query_sources'].append(query)
-                
-                if chunk_id not in query_results_map:
-                    query_results_map[chunk_id] = chunk
-                    all_results.append(chunk)
-                else:
-                    # Chunk found by multiple queries - boost its score
-                    existing_chunk = query_results_map[chunk_id]
-                    existing_chunk['query_sources'].append(query)
-                    # Boost score for multi-query matches
-                    existing_score = existing_chunk.get('combined_score', 0.0)
-                    existing_chunk['combined_score'] = existing_score + 0.2
+                chunk.setdefault('sources', [])
+                chunk.setdefault('query_sources', []).append(query)
+                query_results_map[chunk_id] = chunk
+                all_results.append(chunk)
+            else:
+                # Chunk found by multiple queries - boost its score
+                existing_chunk['query_sources'].append(query)
+                existing_chunk['combined_score'] = existing_chunk.get('combined_score', 0.0) + 0.2
     
     # If we have results from multiple queries, merge and rerank
     if len(queries) > 1 and all_results:
         # Since hybrid_search already returns merged and ranked results,
         # we just need to deduplicate and rerank across all queries
-        # Boost chunks found by multiple queries
-        chunk_scores = {}
+        # Tokenize the question once rather than per chunk
+        question_words = (
+            {word for word in original_question.lower().split() if len(word) > 3}
+            if original_question else set()
+        )
+        
         for chunk in all_results:
-            chunk_id = chunk['chunk_id']
             base_score = chunk.get('combined_score', chunk.get('score', 0.5))
-            query_count = len(chunk.get('query_sources', []))
+            query_count = len(chunk['query_sources'])
             
             # Boost score for chunks found by multiple queries (indicates high relevance)
             if query_count > 1:
                 base_score += (query_count - 1) * 0.3
             
             # Additional boost if original question keywords match chunk content
-            if original_question:
-                chunk_text = chunk.get('text', chunk.get('chunk_text', '')).lower()
-                question_lower = original_question.lower()
-                question_words = set(word for word in question_lower.split() if len(word) > 3)
-                chunk_words = set(word for word in chunk_text.split() if len(word) > 3)
-                matching_words = question_words.intersection(chunk_words)
+            if question_words:
+                chunk_text = chunk.get('text', chunk.get('chunk_text', ''))
+                chunk_words = {word for word in chunk_text.lower().split() if len(word) > 3}
+                matching_words = question_words & chunk_words
                 if matching_words:
                     base_score += len(matching_words) * 0.1
             
-            chunk_scores[chunk_id] = base_score
             chunk['combined_score'] = base_score
         
         # Sort by combined score
-        all_results.sort(key=lambda x: chunk_scores.get(x['chunk_id'], 0), reverse=True)
+        all_results.sort(key=lambda x: x['combined_score'], reverse=True)
         
         # Limit results
         return all_results[:DEFAULT_MAX_CITATIONS * 2]
@@ -196,7 +303,6 @@ def _retrieve_with_multi_query(
     # If single query or no merging needed, return as-is
     return all_results
 
-
 def _retrieve_new_chunks(
     queries: list,
     repo_id: str,
@@ -213,11 +319,10 @@ def _retrieve_new_chunks(
     }
     
     all_chunks = []
-    for query in queries:
-        chunks = hybrid_search(query, repo_id, k=DEFAULT_MAX_CHUNKS_PER_QUERY)
-        
+    for _, chunks in _search_all(queries, repo_id):
         for chunk in chunks:
             if chunk['chunk_id'] not in existing_chunk_ids:
+                _normalize_chunk(chunk)
                 all_chunks.append(chunk)
                 existing_chunk_ids.add(chunk['chunk_id'])
     
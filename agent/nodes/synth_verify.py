@@ -0,0 +1,78 @@
+"""Fused synthesizer and verifier node for the agent."""
+from agent.state import AgentState
+from agent.prompts import get_synth_and_verify_prompt, parse_model_response, SynthesisWithVerification, SYNTH_VERIFY_INSTRUCTIONS
+from agent.nodes.synthesizer import optimize_context
+from core.llm_service import LLMServiceFactory
+from core.citation_service import CitationService
+from core.error_handler import safe_execute
+
+
+def synth_verify_node(state: AgentState) -> AgentState:
+    """
+    Synthesize an answer and verify it in a single LLM call.
+    
+    Replaces the synthesizer -> verifier round trip when
+    settings.fused_synth_verify is enabled. The question and code chunks are
+    sent once, and the model returns the answer together with its own
+    grounding check.
+    
+    Args:
+        state: Current agent state
+    
+    Returns:
+        Updated state with draft answer, citations, and verification result
+    """
+    chunks = state['retrieved_chunks']
+    
+    if not chunks:
+        return {
+            'draft_answer': "No relevant code was found to answer this question.",
+            'citations': [],
+            'verification_result': SynthesisWithVerification().verification.model_dump()
+        }
+    
+    question = state['question']
+    optimized_chunks, reasoning_trace = optimize_context(question, chunks)
+    
+    llm_service = LLMServiceFactory.create_synthesizer_service()
+    prompt = get_synth_and_verify_prompt(question, optimized_chunks)
+    
+    result = safe_execute(
+        _synthesize_and_verify,
+        llm_service,
+        prompt,
+        default_return=SynthesisWithVerification(answer="Error generating answer")
+    )
+    
+    # Use original chunks for citation extraction to preserve full context
+    citations = CitationService().extract_citations_from_answer(
+        result.answer,
+        retrieved_chunks=chunks
+    )
+    verification = result.verification.model_dump()
+    
+    reasoning_trace.append(f"Generated answer with {len(citations)} citations")
+    reasoning_trace.append(
+        f"Verification: grounded={verification['is_grounded']}, "
+        f"unsupported_claims={len(verification['unsupported_claims'])}"
+    )
+    
+    return {
+        'draft_answer': result.answer,
+        'citations': citations,
+        'verification_result': verification,
+        'reasoning_trace': reasoning_trace
+    }
+
+
+def _synthesize_and_verify(llm_service, prompt: str) -> SynthesisWithVerification:
+    """Run the fused prompt and parse its JSON envelope."""
+    response_text = llm_service.invoke_text(prompt, SYNTH_VERIFY_INSTRUCTIONS)
+    result = parse_model_response(response_text, SynthesisWithVerification)
+    
+    # The model ignored the JSON format: keep its text as the answer and
+    # accept it unverified, as the verifier does on a parse failure
+    if not result.answer.strip():
+        result = SynthesisWithVerification(answer=response_text)
+    
+    return result
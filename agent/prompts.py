@@ -1,12 +1,110 @@
 """Prompt templates for the agent."""
 import json
+import re
+import sys
+from functools import lru_cache
+from typing import List
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from core.constants import MAX_CACHED_ANSWER_LENGTH
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+_JSON_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+# Citation formats, matched in a single pass: [path:10-20], (path:10-20),
+# and bare path.ext:10-20. Earlier formats take precedence on duplicates.
+_CITATION_EXTENSIONS = r'py|js|ts|java|go|rs|cpp|c|h|tsx|jsx|md|txt'
+_CITATION_PATTERN = re.compile(
+    r'\[([^\]]+?):(\d+)(?:-(\d+))?\]'
+    r'|\(([^)]+?):(\d+)(?:-(\d+))?\)'
+    # Bare paths only start at the beginning of a path-like word, so the regex
+    # engine doesn't retry every offset (or every dot) inside each word, which
+    # is quadratic in long dotted identifiers
+    rf'|(?<![a-zA-Z0-9_/\\.-])([a-zA-Z0-9_/\\\.-]+\.(?:{_CITATION_EXTENSIONS})):(\d+)(?:-(\d+))?(?=\s|$|,|\.|;|\))'
+)
+
+
+DEFAULT_PLAN_REASONING = "Direct search for question keywords"
+
+
+def _as_text(item) -> str:
+    """Flatten a list item emitted by the LLM (string, object, number) to text."""
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        # e.g. {"claim": "..."} - use the first string value
+        for value in item.values():
+            if isinstance(value, str):
+                return value
+        return json.dumps(item)
+    return str(item)
+
+
+def _as_text_list(value):
+    """Coerce an LLM-emitted field into a list of strings."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [_as_text(item) for item in value if item is not None]
+    return value
+
+
+class _LLMResponseModel(BaseModel):
+    """Base model for JSON emitted by the LLM; null fields take their defaults."""
+    
+    @field_validator('*', mode='before')
+    @classmethod
+    def _null_to_default(cls, value, info):
+        if value is None:
+            return cls.model_fields[info.field_name].get_default(call_default_factory=True)
+        return value
 
 
-def get_planner_prompt(question: str) -> str:
-    """Get the planner prompt with few-shot examples."""
-    return f"""You are a code analyst planning how to answer a question about a codebase.
+class Plan(_LLMResponseModel):
+    """Search plan produced by the planner."""
+    
+    reasoning: str = DEFAULT_PLAN_REASONING
+    search_queries: List[str] = Field(default_factory=list)
+    expected_files: List[str] = Field(default_factory=list)
+    
+    @field_validator('search_queries', 'expected_files', mode='before')
+    @classmethod
+    def _coerce_lists(cls, value):
+        return _as_text_list(value)
 
-Question: {question}
+
+class Verification(_LLMResponseModel):
+    """Grounding check produced by the verifier."""
+    
+    is_grounded: bool = True  # Default to accepting
+    unsupported_claims: List[str] = Field(default_factory=list)
+    missing_information: List[str] = Field(default_factory=list)
+    follow_up_queries: List[str] = Field(default_factory=list)
+    
+    @field_validator('unsupported_claims', 'missing_information', 'follow_up_queries', mode='before')
+    @classmethod
+    def _coerce_lists(cls, value):
+        return _as_text_list(value)
+
+
+class SynthesisWithVerification(_LLMResponseModel):
+    """Answer and self-check produced by the fused synthesize-and-verify call."""
+    
+    answer: str = ""
+    verification: Verification = Field(default_factory=Verification)
+
+
+# Static instruction blocks come first in every prompt and request-specific
+# content (question, code, answer) last, so the long prefix is byte-identical
+# across calls and can be served from provider-side prompt caches.
+PLANNER_INSTRUCTIONS = """You are a code analyst planning how to answer a question about a codebase.
 
 Your task is to create a search plan. Follow these steps:
 1. Analyze what the question is asking for
@@ -23,59 +121,36 @@ EXAMPLES:
 
 Example 1 - Good:
 Question: "Where is user authentication handled?"
-{{
+{
   "reasoning": "Need to find authentication logic, likely in middleware, auth service, or login handlers",
   "search_queries": ["authentication middleware implementation", "user login handler", "JWT token validation", "session management setup"],
   "expected_files": ["auth.py", "middleware.py", "login.py", "security.py"]
-}}
+}
 
 Example 2 - Good:
 Question: "How does the API handle error responses?"
-{{
+{
   "reasoning": "Looking for error handling in API routes, exception handlers, and response formatting",
   "search_queries": ["API error handler implementation", "exception response formatting", "HTTP error status codes", "error middleware"],
   "expected_files": ["api.py", "errors.py", "middleware.py", "handlers.py"]
-}}
+}
 
 Example 3 - Bad (too vague):
-{{
+{
   "reasoning": "Find code",
   "search_queries": ["authentication", "code", "function"],
   "expected_files": []
-}}
+}
 
 GUIDELINES:
 - Make queries specific: include action words (handle, validate, process) and context
 - Use diverse angles: search for the same concept from different perspectives
 - Think about where code lives: main files, services, utilities, middleware
 - Avoid single-word queries or generic terms
+"""
 
-Now create a plan for the question above. Output ONLY valid JSON, no other text:"""
-
-
-def get_synthesizer_prompt(question: str, chunks: list) -> str:
-    """Get the synthesizer prompt with few-shot examples."""
-    
-    # Format chunks with citations
-    chunks_text = ""
-    for i, chunk in enumerate(chunks, 1):
-        file_path = chunk.get('file_path', chunk.get('metadata', {}).get('file_path', 'unknown'))
-        start_line = chunk.get('start_line', chunk.get('metadata', {}).get('start_line', 0))
-        end_line = chunk.get('end_line', chunk.get('metadata', {}).get('end_line', 0))
-        text = chunk.get('text', chunk.get('chunk_text', ''))
-        symbol = chunk.get('symbol_name', chunk.get('metadata', {}).get('symbol_name', ''))
-        
-        chunks_text += f"\n--- Chunk {i}: {file_path}:{start_line}-{end_line}"
-        if symbol:
-            chunks_text += f" (Symbol: {symbol})"
-        chunks_text += f" ---\n{text}\n"
-    
-    return f"""You are a code analyst answering questions about a codebase. Answer using ONLY the provided code chunks.
-
-Question: {question}
 
-Retrieved Code:
-{chunks_text}
+SYNTHESIZER_INSTRUCTIONS = """You are a code analyst answering questions about a codebase. Answer using ONLY the provided code chunks.
 
 INSTRUCTIONS:
 1. Read all code chunks carefully
@@ -108,39 +183,15 @@ EXAMPLE BAD ANSWER (DO NOT DO THIS):
 Authentication is handled in the auth middleware. The code validates tokens and checks permissions. [Some citation that doesn't match the chunks]
 
 CRITICAL RULES:
-1. ONLY use information from the chunks above - do not make assumptions
+1. ONLY use information from the chunks below - do not make assumptions
 2. Cite EVERY claim with exact file paths and line numbers from chunk headers
 3. If information is missing, say "Not found in retrieved code" rather than guessing
 4. Be specific: mention function names, class names, and exact locations
 5. Structure: Start with a direct answer, then provide supporting details with citations
+"""
 
-Now answer the question above. Use the exact file paths and line numbers from the chunk headers:"""
-
-
-def get_verifier_prompt(question: str, draft_answer: str, chunks: list) -> str:
-    """Get the verifier prompt with structured instructions."""
-    
-    # Format chunks for verification
-    chunks_summary = []
-    for chunk in chunks:
-        file_path = chunk.get('file_path', chunk.get('metadata', {}).get('file_path', 'unknown'))
-        start_line = chunk.get('start_line', chunk.get('metadata', {}).get('start_line', 0))
-        end_line = chunk.get('end_line', chunk.get('metadata', {}).get('end_line', 0))
-        text_preview = chunk.get('text', chunk.get('chunk_text', ''))[:200]
-        
-        chunks_summary.append(f"- {file_path}:{start_line}-{end_line}: {text_preview}...")
-    
-    chunks_text = '\n'.join(chunks_summary)
-    
-    return f"""You are a code verification expert. Verify if the answer is fully grounded in the provided code chunks.
-
-Question: {question}
 
-Answer to verify:
-{draft_answer}
-
-Retrieved Code Chunks:
-{chunks_text}
+VERIFIER_INSTRUCTIONS = """You are a code verification expert. Verify if the answer is fully grounded in the provided code chunks.
 
 VERIFICATION PROCESS:
 1. Extract all claims from the answer (each statement that makes an assertion)
@@ -157,73 +208,268 @@ CHECKLIST:
 - [ ] Answer directly addresses the question
 
 OUTPUT FORMAT: Output ONLY valid JSON:
-{{
+{
   "is_grounded": true or false,
   "unsupported_claims": ["exact claim text that's not supported", "another unsupported claim"],
   "missing_information": ["specific information needed", "what would help answer better"],
   "follow_up_queries": ["specific search query 1", "specific search query 2"]
-}}
+}
 
 EXAMPLES:
 
 Example 1 - Well-grounded answer:
-{{
+{
   "is_grounded": true,
   "unsupported_claims": [],
   "missing_information": [],
   "follow_up_queries": []
-}}
+}
 
 Example 2 - Answer with gaps:
-{{
+{
   "is_grounded": false,
   "unsupported_claims": ["Claims middleware is registered in app.py but no chunk shows this"],
   "missing_information": ["How the middleware is registered", "What routes are excluded from auth"],
   "follow_up_queries": ["middleware registration in app.py", "public routes configuration"]
-}}
+}
 
 Example 3 - Citation mismatch:
-{{
+{
   "is_grounded": false,
   "unsupported_claims": ["Citation [auth.py:45-67] claims to show login function but chunk shows validate_token"],
   "missing_information": ["Actual login function implementation"],
   "follow_up_queries": ["user login function implementation", "login endpoint handler"]
-}}
+}
 
 GUIDELINES:
 - Be strict: if a claim can't be verified in chunks, mark it as unsupported
 - Be specific: quote exact claim text that's problematic
 - Generate actionable queries: follow-up queries should be specific search terms
 - If answer is well-grounded, set is_grounded to true and leave lists empty
+"""
+
+
+# Extends the synthesizer instructions so both prompts share the same prefix
+SYNTH_VERIFY_INSTRUCTIONS = SYNTHESIZER_INSTRUCTIONS + """
+SELF-VERIFICATION:
+After drafting the answer, check it against the chunks as a strict reviewer would:
+- Every claim must be supported by a chunk and cited with that chunk's path and lines
+- List claims you could not support, information that is missing, and specific
+  search queries that would find it
+
+OUTPUT FORMAT: Output ONLY valid JSON, with the answer as a JSON string:
+{
+  "answer": "Authentication is handled in [src/middleware/auth.py:12-45] ...",
+  "verification": {
+    "is_grounded": true or false,
+    "unsupported_claims": ["exact claim text that's not supported"],
+    "missing_information": ["specific information needed"],
+    "follow_up_queries": ["specific search query"]
+  }
+}
+"""
+
+
+def get_planner_prompt(question: str) -> str:
+    """
+    Get the planner user prompt.
+    
+    The static instructions and few-shot examples are sent separately as
+    the system message (PLANNER_INSTRUCTIONS), so providers with prompt
+    caching can reuse that prefix across questions.
+    """
+    return f"""Question: {question}
+
+Now create a plan for the question above. Output ONLY valid JSON, no other text:"""
+
+
+def _chunk_fields(chunk: dict) -> tuple:
+    """
+    Read the prompt-facing fields of a chunk in one pass.
+    
+    Vector results nest location fields under 'metadata' while lexical
+    results are flat, so each field falls back to the metadata value.
+    
+    Returns:
+        Tuple of (file_path, start_line, end_line, text, symbol_name)
+    """
+    metadata = chunk.get('metadata') or {}
+    return (
+        chunk.get('file_path', metadata.get('file_path', 'unknown')),
+        chunk.get('start_line', metadata.get('start_line', 0)),
+        chunk.get('end_line', metadata.get('end_line', 0)),
+        chunk.get('text', chunk.get('chunk_text', '')),
+        chunk.get('symbol_name', metadata.get('symbol_name', ''))
+    )
+
+
+def _format_chunks_for_synthesis(chunks: list) -> str:
+    """Format chunks with citable headers for the synthesizer prompts."""
+    parts = []
+    for i, (file_path, start_line, end_line, text, symbol) in enumerate(map(_chunk_fields, chunks), 1):
+        symbol_part = f" (Symbol: {symbol})" if symbol else ""
+        parts.append(f"\n--- Chunk {i}: {file_path}:{start_line}-{end_line}{symbol_part} ---\n{text}\n")
+    
+    return "".join(parts)
+
+
+def get_synthesizer_prompt(question: str, chunks: list) -> str:
+    """Get the synthesizer user prompt (sent with SYNTHESIZER_INSTRUCTIONS as the system message)."""
+    chunks_text = _format_chunks_for_synthesis(chunks)
+    
+    return f"""Retrieved Code:
+{chunks_text}
+
+Question: {question}
+
+Now answer the question above. Use the exact file paths and line numbers from the chunk headers:"""
+
+
+def get_synth_and_verify_prompt(question: str, chunks: list) -> str:
+    """
+    Get the fused user prompt that answers the question and verifies the answer in one call.
+    
+    Sent with SYNTH_VERIFY_INSTRUCTIONS as the system message.
+    """
+    chunks_text = _format_chunks_for_synthesis(chunks)
+    
+    return f"""Retrieved Code:
+{chunks_text}
+
+Question: {question}
+
+Now answer and verify. Use the exact file paths and line numbers from the chunk headers. Output ONLY valid JSON, no other text:"""
+
+
+def get_verifier_prompt(question: str, draft_answer: str, chunks: list) -> str:
+    """
+    Get the verifier user prompt (sent with VERIFIER_INSTRUCTIONS as the system message).
+    
+    Content is ordered from most to least stable across verification
+    retries: question, chunks, then the draft answer, which
+    changes on every retry. Chunks are listed by file and line so the same
+    chunk set always renders identically, letting servers with prefix
+    caching reuse as much of the prompt as possible.
+    """
+    # Format chunks for verification
+    chunk_fields = sorted(map(_chunk_fields, chunks), key=lambda fields: (str(fields[0]), fields[1] or 0))
+    chunks_text = '\n'.join(
+        f"- {file_path}:{start_line}-{end_line}: {text[:200]}..."
+        for file_path, start_line, end_line, text, _ in chunk_fields
+    )
+    
+    return f"""Question: {question}
+
+Retrieved Code Chunks:
+{chunks_text}
+
+Answer to verify:
+{draft_answer}
 
 Now verify the answer above. Output ONLY valid JSON, no other text:"""
 
 
+def _find_json_object_end(text: str, start: int) -> int:
+    """
+    Find the end of the brace-balanced object starting at text[start].
+    
+    A single linear scan that tracks nesting depth and skips braces inside
+    JSON strings (honouring backslash escapes).
+    
+    Args:
+        text: Text to scan
+        start: Index of an opening brace
+    
+    Returns:
+        Index just past the matching closing brace, or -1 if unbalanced
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
 def extract_json_from_response(response: str) -> dict:
     """Extract JSON from LLM response."""
-    # Try to find JSON in the response
-    import re
+    # Fast path: the model followed the "JSON only" instruction. Both
+    # parsers skip surrounding JSON whitespace, so no stripped copy is needed
+    try:
+        return _json_loads(response)
+    except ValueError:
+        pass
     
-    # Remove markdown code blocks
-    response = re.sub(r'```json\s*', '', response)
-    response = re.sub(r'```\s*', '', response)
+    # JSON inside a markdown code block
+    match = _JSON_FENCE_PATTERN.search(response)
+    if match:
+        try:
+            return _json_loads(match.group(1))
+        except ValueError:
+            pass
     
-    # Try to parse
-    try:
-        return json.loads(response.strip())
-    except json.JSONDecodeError:
-        # Try to find JSON object in text
-        match = re.search(r'\{.*\}', response, re.DOTALL)
-        if match:
+    # Try to find JSON object in text
+    start = response.find('{')
+    while start != -1:
+        end = _find_json_object_end(response, start)
+        if end != -1:
             try:
-                return json.loads(match.group())
-            except json.JSONDecodeError:
+                return _json_loads(response[start:end])
+            except ValueError:
                 pass
+        start = response.find('{', start + 1)
     
     # Fallback
     return {}
 
 
+def parse_model_response(response: str, model: type) -> BaseModel:
+    """
+    Parse an LLM response into a pydantic model.
+    
+    Validates the raw response directly when it is pure JSON, and falls
+    back to extract_json_from_response for fenced or embedded JSON. Fields
+    that fail validation take their defaults, so one malformed field does
+    not discard the rest of the response.
+    
+    Args:
+        response: Raw LLM response text
+        model: Pydantic model class to validate against
+    
+    Returns:
+        Validated model instance
+    """
+    try:
+        return model.model_validate_json(response.strip())
+    except ValidationError:
+        pass
+    
+    data = extract_json_from_response(response)
+    if not isinstance(data, dict):
+        data = {}
+    
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        invalid_fields = {error['loc'][0] for error in e.errors() if error['loc']}
+        return model.model_validate({k: v for k, v in data.items() if k not in invalid_fields})
+
+
 def extract_citations(answer_text: str) -> list:
     """
     Extract citations from answer text.
@@ -233,71 +479,67 @@ def extract_citations(answer_text: str) -> list:
     - [file_path:line] (single line)
     - (file_path:start_line-end_line) (parentheses format)
     - file_path:start_line-end_line (no brackets, with file extension)
-    """
-    import re
     
-    citations = []
-    seen_keys = set()
+    The text is scanned once. Citations are returned grouped by format in
+    the order above, and a (file_path, start_line) pair cited in several
+    formats keeps the first format's line range. Results are memoized per
+    answer text (up to MAX_CACHED_ANSWER_LENGTH characters), so a repeated
+    answer, e.g. one served from the LLM response cache, is not re-scanned.
+    """
+    # Every citation format contains ':', so answers without one (e.g. "Not
+    # found in the retrieved code") skip the regex scan and the memo entry
+    if ':' not in answer_text:
+        return []
     
-    # Pattern 1: [file_path:start_line-end_line] or [file_path:line]
-    _extract_with_pattern(
-        answer_text,
-        r'\[([^\]]+?):(\d+)(?:-(\d+))?\]',
-        citations,
-        seen_keys
-    )
+    if len(answer_text) > MAX_CACHED_ANSWER_LENGTH:
+        spans = _find_citation_spans(answer_text)
+    else:
+        spans = _find_citation_spans_cached(answer_text)
     
-    # Pattern 2: (file_path:start_line-end_line) or (file_path:line)
-    _extract_with_pattern(
-        answer_text,
-        r'\(([^)]+?):(\d+)(?:-(\d+))?\)',
-        citations,
-        seen_keys
-    )
+    # Fresh dicts on every call: callers add snippets to them
+    return [
+        {'file_path': file_path, 'start_line': start_line, 'end_line': end_line, 'text_snippet': ''}
+        for file_path, start_line, end_line in spans
+    ]
+
+
+def contains_citation(text: str) -> bool:
+    """Check whether text contains at least one citation in any supported format."""
+    return ':' in text and _CITATION_PATTERN.search(text) is not None
+
+
+def _find_citation_spans(answer_text: str) -> tuple:
+    """Find unique (file_path, start_line, end_line) citation spans in answer text."""
+    # findall yields one 9-tuple per match: (path, start, end) for each
+    # format, with only the matching format's slots filled in
+    matches_by_format = ([], [], [])
+    for groups in _CITATION_PATTERN.findall(answer_text):
+        if groups[0]:
+            matches_by_format[0].append(groups[0:3])
+        elif groups[3]:
+            matches_by_format[1].append(groups[3:6])
+        else:
+            matches_by_format[2].append(groups[6:9])
     
-    # Pattern 3: file_path:start_line-end_line (no brackets, requires file extension)
-    # Simplified pattern to reduce complexity
-    file_extensions = r'py|js|ts|java|go|rs|cpp|c|h|tsx|jsx|md|txt'
-    pattern3 = rf'([a-zA-Z0-9_/\\\.-]+\.(?:{file_extensions})):(\d+)(?:-(\d+))?(?=\s|$|,|\.|;|\))'
-    _extract_with_pattern(
-        answer_text,
-        pattern3,
-        citations,
-        seen_keys
-    )
+    citations = []
+    seen_keys = set()
+    for format_matches in matches_by_format:
+        for path, start, end in format_matches:
+            file_path = sys.intern(path.strip())
+            start_line = int(start)
+            key = (file_path, start_line)
+            if key in seen_keys:
+                continue
+            
+            seen_keys.add(key)
+            citations.append((file_path, start_line, int(end) if end else start_line))
     
-    return citations
+    return tuple(citations)
 
 
-def _extract_with_pattern(
-    text: str,
-    pattern: str,
-    citations: list,
-    seen_keys: set
-) -> None:
-    """
-    Extract citations using a regex pattern and add to citations list.
-    
-    Args:
-        text: Text to search
-        pattern: Regex pattern with groups (file_path, start_line, optional end_line)
-        citations: List to append citations to
-        seen_keys: Set of (file_path, start_line) tuples to avoid duplicates
-    """
-    import re
-    
-    matches = re.findall(pattern, text)
-    for match in matches:
-        file_path = match[0].strip()
-        start_line = int(match[1])
-        end_line = int(match[2]) if len(match) > 2 and match[2] else start_line
-        
-        key = (file_path, start_line)
-        if key not in seen_keys:
-            seen_keys.add(key)
-            citations.append({
-                'file_path': file_path,
-                'start_line': start_line,
-                'end_line': end_line,
-                'text_snippet': ''
-            })
+_find_citation_spans_cached = lru_cache(maxsize=256)(_find_citation_spans)
+
+
+def reset_prompt_caches() -> None:
+    """Clear memoized citation parses (for test isolation)."""
+    _find_citation_spans_cached.cache_clear()
@@ -1,5 +1,6 @@
 """Agent state definition for LangGraph."""
-from typing import TypedDict, List, Optional, Dict, Any
+import operator
+from typing import TypedDict, List, Optional, Dict, Any, Set, Annotated
 
 
 class AgentState(TypedDict, total=False):
@@ -13,7 +14,10 @@ class AgentState(TypedDict, total=False):
     plan: Optional[Dict[str, Any]]  # {"reasoning": str, "search_queries": List[str], "expected_files": List[str]}
     
     # Retrieval
-    retrieved_chunks: List[Dict[str, Any]]  # [{chunk_id, text, file, lines, score}]
+    # Flat {chunk_id, file_path, start_line, end_line, symbol_name, text, combined_score, ...}
+    # (normalized by the retriever; vector results also keep their 'metadata')
+    retrieved_chunks: List[Dict[str, Any]]
+    retrieved_chunk_ids: Set[str]  # chunk_ids of retrieved_chunks, kept in sync by the retriever
     retrieval_iteration: int
     
     # Synthesis
@@ -25,4 +29,4 @@ class AgentState(TypedDict, total=False):
     # Output
     final_answer: Optional[str]
     citations: List[Dict[str, Any]]  # [{file, start_line, end_line, text_snippet}]
-    reasoning_trace: List[str]
+    reasoning_trace: Annotated[List[str], operator.add]  # Nodes return only their new entries
@@ -1,6 +1,15 @@
 """API routes for the codebase understanding agent."""
 from fastapi import APIRouter, BackgroundTasks, HTTPException
-from typing import List
+from fastapi.responses import StreamingResponse
+from functools import lru_cache
+from typing import Any, Dict, List
+import json
+
+try:
+    import orjson  # noqa: F401 - required by ORJSONResponse
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as FastJSONResponse
 from app.schemas import (
     IndexRequest, IndexResponse, QuestionRequest, AnswerResponse,
     RepoStatus, RepoSummary, ArchitectureSummaryResponse, Citation
@@ -20,12 +29,37 @@ from core.constants import MESSAGE_INDEXING_STARTED
 
 router = APIRouter()
 
-# Initialize services
-indexing_service = IndexingService()
-repository_service = RepositoryService()
-agent_service = AgentService()
-architecture_service = ArchitectureService()
-deletion_service = RepositoryDeletionService()
+
+# Services are created on first use, so importing the routes does not open
+# the metadata store
+@lru_cache(maxsize=1)
+def get_indexing_service() -> IndexingService:
+    """Get the shared indexing service."""
+    return IndexingService()
+
+
+@lru_cache(maxsize=1)
+def get_repository_service() -> RepositoryService:
+    """Get the shared repository service."""
+    return RepositoryService()
+
+
+@lru_cache(maxsize=1)
+def get_agent_service() -> AgentService:
+    """Get the shared agent service."""
+    return AgentService()
+
+
+@lru_cache(maxsize=1)
+def get_architecture_service() -> ArchitectureService:
+    """Get the shared architecture service."""
+    return ArchitectureService()
+
+
+@lru_cache(maxsize=1)
+def get_deletion_service() -> RepositoryDeletionService:
+    """Get the shared repository deletion service."""
+    return RepositoryDeletionService()
 
 
 @router.post("/repos/index", response_model=IndexResponse, tags=["Repositories"])
@@ -38,6 +72,8 @@ async def index_repo(request: IndexRequest, background_tasks: BackgroundTasks):
     if not request.github_url and not request.local_path:
         raise HTTPException(400, "Either github_url or local_path must be provided")
     
+    indexing_service = get_indexing_service()
+    
     # Generate repo_id
     repo_id = indexing_service.start_indexing(
         github_url=request.github_url,
@@ -63,15 +99,17 @@ async def index_repo(request: IndexRequest, background_tasks: BackgroundTasks):
 @router.get("/repos/{repo_id}/status", response_model=RepoStatus, tags=["Repositories"])
 async def get_repo_status(repo_id: str):
     """Get the indexing status of a repository."""
-    status = indexing_service.get_indexing_status(repo_id)
+    status = get_indexing_service().get_indexing_status(repo_id)
     return status
 
 
 @router.get("/repos", response_model=List[RepoSummary], tags=["Repositories"])
 async def list_repos():
     """List all indexed repositories."""
-    repos = repository_service.list_repositories()
-    return repos
+    # Stored rows already have the RepoSummary shape; returning a response
+    # directly skips re-validating every repo's stats through pydantic
+    repos = get_repository_service().list_repositories()
+    return FastJSONResponse(repos)
 
 
 @router.post("/chat", response_model=AnswerResponse, tags=["Chat"])
@@ -86,39 +124,78 @@ async def ask_question(request: QuestionRequest):
     4. Optionally verify the answer is grounded in the code
     """
     try:
-        result = agent_service.run_agent(
+        # Awaiting keeps the event loop free for other requests while the agent runs
+        result = await get_agent_service().arun_agent(
             question=request.question,
             repo_id=request.repo_id,
             use_verification=request.use_verification
         )
         
-        # Format response
-        citations = [
-            Citation(
-                file_path=c['file_path'],
-                start_line=c['start_line'],
-                end_line=c['end_line'],
-                text_snippet=c.get('text_snippet', '')
-            )
-            for c in result.get('citations', [])
-        ]
-        
-        return AnswerResponse(
-            answer=result.get('final_answer', result.get('draft_answer', 'No answer generated')),
-            citations=citations,
-            reasoning_trace=result.get('reasoning_trace')
-        )
+        return _build_answer_response(result)
     except RepositoryNotFoundError as e:
         raise HTTPException(404, str(e))
     except AgentExecutionError as e:
         raise HTTPException(500, str(e))
 
 
+@router.post("/chat/stream", tags=["Chat"])
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Ask a question and stream the answer as server-sent events.
+    
+    Each frame is `data: <json>`:
+    - `{"delta": "..."}` for each token of the draft answer
+    - `{"restart": true}` when verification requests a new draft
+    - `{"done": true, "answer": ..., "citations": [...], "reasoning_trace": [...]}` last
+    - `{"error": "..."}` if the agent fails mid-stream
+    """
+    try:
+        events = get_agent_service().astream_agent(
+            question=request.question,
+            repo_id=request.repo_id,
+            use_verification=request.use_verification
+        )
+    except RepositoryNotFoundError as e:
+        raise HTTPException(404, str(e))
+    
+    async def event_stream():
+        try:
+            async for event in events:
+                if 'result' in event:
+                    payload = {'done': True, **_build_answer_response(event['result']).model_dump()}
+                else:
+                    payload = event
+                yield f"data: {json.dumps(payload)}\n\n"
+        except AgentExecutionError as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+def _build_answer_response(result: Dict[str, Any]) -> AnswerResponse:
+    """Format a final agent state as an answer response."""
+    citations = [
+        Citation(
+            file_path=c['file_path'],
+            start_line=c['start_line'],
+            end_line=c['end_line'],
+            text_snippet=c.get('text_snippet', '')
+        )
+        for c in result.get('citations', [])
+    ]
+    
+    return AnswerResponse(
+        answer=result.get('final_answer', result.get('draft_answer', 'No answer generated')),
+        citations=citations,
+        reasoning_trace=result.get('reasoning_trace')
+    )
+
+
 @router.get("/repos/{repo_id}/summary", response_model=ArchitectureSummaryResponse, tags=["Repositories"])
 async def get_architecture_summary(repo_id: str):
     """Generate an architecture summary for the repository."""
     try:
-        result = architecture_service.generate_summary(repo_id)
+        result = await get_architecture_service().agenerate_summary(repo_id)
         return ArchitectureSummaryResponse(**result)
     except RepositoryNotFoundError as e:
         raise HTTPException(404, str(e))
@@ -128,7 +205,7 @@ async def get_architecture_summary(repo_id: str):
 async def delete_repo(repo_id: str):
     """Delete a repository and all its indexed data."""
     try:
-        message = deletion_service.delete_repository(repo_id)
+        message = get_deletion_service().delete_repository(repo_id)
         return {"message": message}
     except RepositoryNotFoundError as e:
         raise HTTPException(404, str(e))
@@ -1,6 +1,7 @@
 """Application configuration."""
 import os
 from pathlib import Path
+from typing import List
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -21,6 +22,9 @@ class Settings(BaseSettings):
         description="Hugging Face API key (get from https://huggingface.co/settings/tokens)"
     )
     
+    # CORS (set to the deployed frontend origins in production)
+    cors_origins: List[str] = ["*"]
+    
     # Data directories
     data_dir: Path = Path("./data")
     repos_dir: Path = Path("./data/repos")
@@ -37,9 +41,22 @@ class Settings(BaseSettings):
     synthesizer_model: str = "meta-llama/Llama-3.2-3B-Instruct"
     verifier_model: str = "meta-llama/Llama-3.2-3B-Instruct"
     
+    # HTTP connection pooling for the Hugging Face API
+    hf_pool_connections: int = 10  # Number of host pools to cache
+    hf_pool_maxsize: int = 32  # Maximum connections kept alive per host
+    
+    # LLM response caching (only deterministic, temperature 0 calls are cached)
+    llm_cache_enabled: bool = True
+    llm_cache_path: Path = Path("./data/llm_cache.db")
+    llm_cache_size: int = 256  # Maximum entries kept in memory
+    llm_cache_disk_size: int = 5000  # Maximum entries kept on disk
+    
     # Agent settings
     max_retrieval_iterations: int = 3
     max_chunks_per_query: int = 12
+    max_search_workers: int = 8  # Concurrent hybrid searches per retrieval iteration
+    fused_synth_verify: bool = False  # Answer and verify in a single LLM call
+    structural_verify: bool = True  # Accept fully cited answers without a verifier LLM call
     chunk_size: int = 1200
     chunk_overlap: int = 200
     
@@ -1,22 +1,25 @@
 """Main FastAPI application."""
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import router
+from app.api import router, FastJSONResponse
+from app.config import settings
 
 
 app = FastAPI(
     title="Autonomous Codebase Understanding Agent",
     description="An intelligent agent that indexes repositories and answers questions with citations",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=FastJSONResponse
 )
 
-# Add CORS middleware
+# Add CORS middleware. Explicit methods and headers are validated against
+# precomputed lists instead of echoing each preflight's requested headers.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, specify actual origins
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type", "Authorization"],
 )
 
 # Include API router
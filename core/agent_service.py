@@ -1,11 +1,15 @@
 """Agent service for running agent workflows."""
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator
 from agent.graph import create_agent_graph, create_simple_agent_graph
 from core.exceptions import AgentExecutionError, RepositoryNotFoundError
 from core.repository_service import RepositoryService
 from core.constants import ERROR_AGENT_EXECUTION
 
 
+# Node whose LLM tokens are streamed to the client as the draft answer
+_STREAMED_NODE = "synthesizer"
+
+
 class AgentService:
     """Service for agent operations."""
     
@@ -37,22 +41,129 @@ class AgentService:
         # Validate repository exists
         self.repository_service.validate_repository_exists(repo_id)
         
-        # Create appropriate graph
-        if use_verification:
-            agent = create_agent_graph()
-        else:
-            agent = create_simple_agent_graph()
+        agent = self._get_graph(use_verification)
         
         # Run the agent
         try:
-            result = agent.invoke({
-                'question': question,
-                'repo_id': repo_id,
-                'retrieval_iteration': 0,
-                'reasoning_trace': []
-            })
+            result = agent.invoke(self._initial_state(question, repo_id))
             return result
         except Exception as e:
             raise AgentExecutionError(
                 ERROR_AGENT_EXECUTION.format(error=str(e))
             )
+    
+    async def arun_agent(
+        self,
+        question: str,
+        repo_id: str,
+        use_verification: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Run the agent without blocking the event loop.
+        
+        LangGraph runs the (blocking) node functions in its executor, so an
+        async server can answer several questions concurrently while each
+        waits on LLM calls.
+        
+        Args:
+            question: Question to answer
+            repo_id: Repository ID
+            use_verification: Whether to use verification loop
+        
+        Returns:
+            Agent result dictionary
+        
+        Raises:
+            RepositoryNotFoundError: If repository not found
+            AgentExecutionError: If agent execution fails
+        """
+        # Validate repository exists
+        self.repository_service.validate_repository_exists(repo_id)
+        
+        agent = self._get_graph(use_verification)
+        
+        # Run the agent
+        try:
+            return await agent.ainvoke(self._initial_state(question, repo_id))
+        except Exception as e:
+            raise AgentExecutionError(
+                ERROR_AGENT_EXECUTION.format(error=str(e))
+            )
+    
+    def astream_agent(
+        self,
+        question: str,
+        repo_id: str,
+        use_verification: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the agent, streaming the answer as it is synthesized.
+        
+        The repository is validated before the stream is returned, so a
+        missing repository raises here rather than mid-stream. With
+        settings.fused_synth_verify the answer is produced inside a JSON
+        envelope, so no deltas are streamed and only the result is emitted.
+        
+        Args:
+            question: Question to answer
+            repo_id: Repository ID
+            use_verification: Whether to use verification loop
+        
+        Returns:
+            Async iterator of events: {'delta': str} per synthesizer token,
+            {'restart': True} when a verification retry starts a new draft,
+            and finally {'result': dict} with the final agent state
+        
+        Raises:
+            RepositoryNotFoundError: If repository not found
+        """
+        # Validate repository exists
+        self.repository_service.validate_repository_exists(repo_id)
+        
+        agent = self._get_graph(use_verification)
+        return self._stream_events(agent, self._initial_state(question, repo_id))
+    
+    @staticmethod
+    async def _stream_events(agent, initial_state: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Translate LangGraph events into answer stream events.
+        
+        Raises:
+            AgentExecutionError: If agent execution fails
+        """
+        streamed = False
+        try:
+            async for event in agent.astream_events(initial_state, version="v2"):
+                kind = event['event']
+                if kind == 'on_chat_model_stream' and event['metadata'].get('langgraph_node') == _STREAMED_NODE:
+                    delta = event['data']['chunk'].content
+                    if delta:
+                        streamed = True
+                        yield {'delta': delta}
+                elif kind == 'on_chain_start' and event['name'] == _STREAMED_NODE and streamed:
+                    # Verification asked for more evidence; a new draft follows
+                    streamed = False
+                    yield {'restart': True}
+                elif kind == 'on_chain_end' and not event['parent_ids']:
+                    yield {'result': event['data']['output']}
+        except Exception as e:
+            raise AgentExecutionError(
+                ERROR_AGENT_EXECUTION.format(error=str(e))
+            )
+    
+    @staticmethod
+    def _get_graph(use_verification: bool):
+        """Get the appropriate graph (compiled once per process)."""
+        if use_verification:
+            return create_agent_graph()
+        return create_simple_agent_graph()
+    
+    @staticmethod
+    def _initial_state(question: str, repo_id: str) -> Dict[str, Any]:
+        """Build the initial agent state for a question."""
+        return {
+            'question': question,
+            'repo_id': repo_id,
+            'retrieval_iteration': 0,
+            'reasoning_trace': []
+        }
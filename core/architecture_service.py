@@ -1,11 +1,21 @@
 """Architecture analysis service."""
-from typing import Dict, List
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, List, Optional
 from tools.file_tools import get_file_structure
 from tools.repo_tools import get_key_files
 from core.repository_service import RepositoryService
 from core.llm_service import LLMServiceFactory
 from core.error_handler import safe_execute
 from core.exceptions import RepositoryNotFoundError
+from core.constants import SUMMARY_CACHE_TTL_SECONDS, SUMMARY_CACHE_SIZE
+
+
+_SUMMARY_FAILED = "Could not generate summary"
 
 
 class ArchitectureService:
@@ -14,6 +24,9 @@ class ArchitectureService:
     def __init__(self):
         """Initialize the architecture service."""
         self.repository_service = RepositoryService()
+        # Prompt hash -> (created_at, summary), least recently used first
+        self._summary_cache: OrderedDict = OrderedDict()
+        self._summary_cache_lock = threading.Lock()
     
     def generate_summary(self, repo_id: str) -> Dict[str, any]:
         """
@@ -54,27 +67,100 @@ class ArchitectureService:
             'file_structure': file_structure
         }
     
+    async def agenerate_summary(self, repo_id: str) -> Dict[str, any]:
+        """
+        Generate architecture summary without blocking the event loop.
+        
+        The key-file and file-structure lookups are independent I/O, so
+        they run concurrently in worker threads, followed by the LLM call.
+        
+        Args:
+            repo_id: Repository ID
+        
+        Returns:
+            Dictionary with summary, key_files, and file_structure
+        
+        Raises:
+            RepositoryNotFoundError: If repository not found
+        """
+        repo = self.repository_service.get_repository(repo_id)
+        
+        key_files, file_structure = await asyncio.gather(
+            asyncio.to_thread(safe_execute, get_key_files, repo_id, top_n=10, default_return=[]),
+            asyncio.to_thread(safe_execute, get_file_structure, repo_id, max_depth=3, default_return={})
+        )
+        
+        summary = await asyncio.to_thread(self._generate_llm_summary, repo, key_files, file_structure)
+        
+        return {
+            'summary': summary,
+            'key_files': key_files,
+            'file_structure': file_structure
+        }
+    
     def _generate_llm_summary(
         self,
         repo: Dict,
         key_files: List[str],
         file_structure: Dict
     ) -> str:
-        """Generate summary using LLM."""
+        """
+        Generate summary using LLM.
+        
+        Summaries are sampled (non-zero temperature), so the LLM response
+        cache skips them; successful ones are reused here for
+        SUMMARY_CACHE_TTL_SECONDS per repository, commit, and prompt, so
+        re-indexing a new commit produces a fresh summary.
+        """
         stats = repo.get('stats', {})
         by_language = stats.get('by_language', {})
         
-        llm_service = LLMServiceFactory.create_summary_service()
-        
         prompt = self._build_summary_prompt(stats, by_language, key_files, file_structure)
+        cache_key = hashlib.blake2b(
+            f"{repo.get('repo_id')}\n{repo.get('commit_hash')}\n{prompt}".encode(),
+            digest_size=16
+        ).hexdigest()
+        
+        cached_summary = self._get_cached_summary(cache_key)
+        if cached_summary is not None:
+            return cached_summary
+        
+        llm_service = LLMServiceFactory.create_summary_service()
         
         summary = safe_execute(
             lambda: llm_service.invoke_text(prompt),
-            default_return="Could not generate summary"
+            default_return=_SUMMARY_FAILED
         )
         
+        # API errors come back as "Error: ..." text; don't keep failures
+        if summary != _SUMMARY_FAILED and not summary.startswith("Error:"):
+            self._cache_summary(cache_key, summary)
+        
         return summary
     
+    def _get_cached_summary(self, cache_key: str) -> Optional[str]:
+        """Return an unexpired cached summary, or None."""
+        with self._summary_cache_lock:
+            entry = self._summary_cache.get(cache_key)
+            if entry is None:
+                return None
+            
+            created_at, summary = entry
+            if time.monotonic() - created_at > SUMMARY_CACHE_TTL_SECONDS:
+                del self._summary_cache[cache_key]
+                return None
+            
+            self._summary_cache.move_to_end(cache_key)
+            return summary
+    
+    def _cache_summary(self, cache_key: str, summary: str) -> None:
+        """Store a summary, evicting the least recently used entries."""
+        with self._summary_cache_lock:
+            self._summary_cache[cache_key] = (time.monotonic(), summary)
+            self._summary_cache.move_to_end(cache_key)
+            while len(self._summary_cache) > SUMMARY_CACHE_SIZE:
+                self._summary_cache.popitem(last=False)
+    
     def _build_summary_prompt(
         self,
         stats: Dict,
@@ -83,17 +169,23 @@ class ArchitectureService:
         file_structure: Dict
     ) -> str:
         """Build the summary prompt."""
+        # Joined outside the f-string: Python 3.11 forbids backslashes in
+        # f-string expressions
+        languages = ', '.join(f"{k}: {v} files" for k, v in islice(by_language.items(), 5))
+        key_files_text = "\n".join(f"- {f}" for f in key_files[:10])
+        structure_text = "\n".join(f"- {k}/" for k in islice(file_structure, 10))
+        
         return f"""Analyze this codebase structure and generate a 2-3 paragraph architecture overview.
 
 Repository Stats:
 - Total files: {stats.get('total_files', 0)}
-- Languages: {', '.join(f"{k}: {v} files" for k, v in list(by_language.items())[:5])}
+- Languages: {languages}
 
 Key Files:
-{chr(10).join(f"- {f}" for f in key_files[:10])}
+{key_files_text}
 
 Top-level Structure:
-{chr(10).join(f"- {k}/" for k in list(file_structure.keys())[:10])}
+{structure_text}
 
 Focus on:
 1. Overall architecture pattern (MVC, microservices, monolith, etc.)
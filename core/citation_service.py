@@ -1,11 +1,147 @@
 """Citation service for handling citations."""
-from typing import List, Dict, Optional
-from tools.file_tools import open_span
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Optional, Set
+from tools.file_tools import open_file
 from agent.prompts import extract_citations
-from core.constants import DEFAULT_SNIPPET_LENGTH
+from core.constants import (
+    DEFAULT_SNIPPET_LENGTH,
+    SNIPPET_UNAVAILABLE,
+    PARALLEL_SNIPPET_MIN_FILES,
+    MAX_SNIPPET_READ_WORKERS
+)
 from core.exceptions import FileNotFoundError
 
 
+# Fallback citation inference: full file paths, component/class names
+# (PascalCase), and bare file names mentioned in an answer. The patterns only
+# match ASCII, so re.ASCII lets \b skip Unicode word-character lookups.
+_FILE_MENTION_PATTERN = re.compile(r'([a-zA-Z0-9_/\\\.-]+\.(?:py|js|ts|java|go|rs|cpp|c|h|tsx|jsx|md|txt))', re.ASCII)
+_COMPONENT_PATTERN = re.compile(r'\b([A-Z][a-zA-Z0-9]+)\b', re.ASCII)
+_FILENAME_PATTERN = re.compile(r'\b([a-zA-Z0-9_-]+\.(?:py|js|ts|tsx|jsx|java|go|rs|cpp|c|h|md|txt))\b', re.ASCII)
+
+# Answer post-processing
+_SUMMARY_PREFIX_PATTERN = re.compile(r'^(Brief\s+)?Summary:\s*', re.IGNORECASE)
+_DETAILED_PREFIX_PATTERN = re.compile(r'^(Detailed\s+)?Explanation:\s*', re.IGNORECASE)
+_BRACKET_CITATION_PATTERN = re.compile(r'\[([^\]]+?):(\d+)(?:-(\d+))?\]')
+_INLINE_CITATION_PATTERN = re.compile(r'\[[^\]]+:\d+(?:-\d+)?\]')
+_SENTENCE_PATTERN = re.compile(r'([^.!?]+[.!?]+)')
+_PERIODS_PATTERN = re.compile(r'\.+')
+_SENTENCE_BREAK_PATTERN = re.compile(r'[.!?][ \n]')
+
+# Chunk and mention paths repeat across answers; basename is a pure function
+_basename = lru_cache(maxsize=4096)(os.path.basename)
+
+
+@lru_cache(maxsize=128)
+def _read_file_lines(repo_id: str, file_path: str) -> tuple:
+    """
+    Read a repository file once and return its lines.
+    
+    Read errors propagate; lru_cache does not memoize exceptions, so a file
+    that was transiently unreadable is retried on the next request.
+    """
+    return tuple(open_file(repo_id, file_path).split('\n'))
+
+
+@lru_cache(maxsize=512)
+def _span_snippet(repo_id: str, file_path: str, start_line: int, end_line: int) -> str:
+    """
+    Get the (length-limited) snippet for a cited span.
+    
+    Args:
+        repo_id: Repository ID
+        file_path: Path to file (relative to repo root)
+        start_line: Starting line number (1-indexed)
+        end_line: Ending line number (inclusive)
+    
+    Returns:
+        Snippet text
+    
+    Raises:
+        Exception: If the file cannot be read (not cached)
+    """
+    lines = _read_file_lines(repo_id, file_path)
+    
+    # Adjust for 1-indexed lines
+    start_idx = max(0, start_line - 1)
+    end_idx = min(len(lines), end_line)
+    snippet = '\n'.join(lines[start_idx:end_idx])
+    
+    # Limit snippet length
+    if len(snippet) > DEFAULT_SNIPPET_LENGTH:
+        snippet = snippet[:DEFAULT_SNIPPET_LENGTH] + "..."
+    
+    return snippet
+
+
+def _citation_snippet(repo_id: str, citation: Dict, unreadable: Set[str]) -> str:
+    """
+    Get the snippet for a citation, or SNIPPET_UNAVAILABLE if it has no usable span.
+    
+    Args:
+        repo_id: Repository ID
+        citation: Citation dictionary
+        unreadable: Files that failed to read during the current call; updated
+            in place so each missing file is only attempted once per call
+    """
+    file_path = citation.get('file_path')
+    start_line = citation.get('start_line')
+    end_line = citation.get('end_line')
+    if not file_path or not isinstance(start_line, int) or not isinstance(end_line, int):
+        return SNIPPET_UNAVAILABLE
+    if file_path in unreadable:
+        return SNIPPET_UNAVAILABLE
+    
+    try:
+        return _span_snippet(repo_id, file_path, start_line, end_line)
+    except Exception as e:
+        print(f"Could not read snippet from {file_path}: {e}")
+        unreadable.add(file_path)
+        return SNIPPET_UNAVAILABLE
+
+
+def _chunk_location(chunk: Dict) -> tuple:
+    """Return a chunk's (file_path, start_line, end_line), falling back to its metadata."""
+    metadata = chunk.get('metadata') or {}
+    return (
+        chunk.get('file_path', metadata.get('file_path', '')),
+        chunk.get('start_line', metadata.get('start_line', 0)),
+        chunk.get('end_line', metadata.get('end_line', 0))
+    )
+
+
+def _prefetch_files(repo_id: str, file_paths: List[str], unreadable: Set[str]) -> None:
+    """
+    Read files concurrently into the line cache before snippets are sliced.
+    
+    Args:
+        repo_id: Repository ID
+        file_paths: Distinct file paths to read
+        unreadable: Updated in place with files that failed to read
+    """
+    def load(file_path: str) -> Optional[str]:
+        try:
+            _read_file_lines(repo_id, file_path)
+            return None
+        except Exception as e:
+            print(f"Could not read snippet from {file_path}: {e}")
+            return file_path
+    
+    with ThreadPoolExecutor(max_workers=min(MAX_SNIPPET_READ_WORKERS, len(file_paths))) as executor:
+        unreadable.update(file_path for file_path in executor.map(load, file_paths) if file_path)
+
+
+def clear_citation_cache() -> None:
+    """Clear cached file contents and snippets (call after a repository is re-indexed or deleted)."""
+    _read_file_lines.cache_clear()
+    _span_snippet.cache_clear()
+
+
 class CitationService:
     """Service for citation operations."""
     
@@ -53,147 +189,149 @@ class CitationService:
         Returns:
             List of inferred citations
         """
-        import re
-        import os
-        citations = []
-        seen_keys = set()
+        # Read each chunk's location once (flat fields, falling back to metadata)
+        locations = [_chunk_location(chunk) for chunk in retrieved_chunks]
         
         # Strategy 1: Extract full file paths with extensions
-        file_pattern = r'([a-zA-Z0-9_/\\\.-]+\.(?:py|js|ts|java|go|rs|cpp|c|h|tsx|jsx|md|txt))'
-        mentioned_files = set(re.findall(file_pattern, answer_text))
+        mentioned_files = set(_FILE_MENTION_PATTERN.findall(answer_text))
+        
+        # Index mentioned paths by file name, so each chunk only compares the
+        # paths that could end with its own file name
+        mentions_by_filename = {}
+        for mentioned_file in mentioned_files:
+            mentions_by_filename.setdefault(_basename(mentioned_file), []).append(mentioned_file)
         
         # Strategy 2: Extract component/class names (PascalCase or UPPER_CASE)
-        component_pattern = r'\b([A-Z][a-zA-Z0-9]+(?:[A-Z][a-zA-Z0-9]+)*)\b'
-        mentioned_components = set(re.findall(component_pattern, answer_text))
+        mentioned_components = set(_COMPONENT_PATTERN.findall(answer_text))
         
         # Strategy 3: Extract file names without paths (e.g., "App.tsx", "main.py")
-        filename_pattern = r'\b([a-zA-Z0-9_-]+\.(?:py|js|ts|tsx|jsx|java|go|rs|cpp|c|h|md|txt))\b'
-        mentioned_filenames = set(re.findall(filename_pattern, answer_text))
+        mentioned_filenames = set(_FILENAME_PATTERN.findall(answer_text))
+        
+        # Nothing to match against: go straight to the top chunks
+        if not (mentioned_files or mentioned_components or mentioned_filenames):
+            return self._top_chunk_citations(locations)
+        
+        # Keyed by (file_path, start_line); dicts keep insertion order
+        citations = {}
+        
+        # Whether a file is mentioned depends only on its path, and several
+        # chunks usually come from the same file
+        path_mentioned = {}
         
         # Match mentioned files/components with retrieved chunks
-        for chunk in retrieved_chunks:
-            file_path = chunk.get('file_path', chunk.get('metadata', {}).get('file_path', ''))
+        for file_path, start_line, end_line in locations:
             if not file_path:
                 continue
-                
-            start_line = chunk.get('start_line', chunk.get('metadata', {}).get('start_line', 0))
-            end_line = chunk.get('end_line', chunk.get('metadata', {}).get('end_line', 0))
-            
-            # Get filename and basename for matching
-            filename = os.path.basename(file_path)
-            basename = os.path.splitext(filename)[0]
             
-            # Check if this chunk should be cited
-            should_cite = False
-            
-            # Match 1: Exact file path match
-            if file_path in mentioned_files:
-                should_cite = True
-            # Match 2: Filename match
-            elif filename in mentioned_filenames:
-                should_cite = True
-            # Match 3: Component name matches filename (e.g., "EmergencyButton" matches "EmergencyButton.tsx")
-            elif basename in mentioned_components:
-                should_cite = True
-            # Match 4: Partial path match (e.g., "App.tsx" matches "src/components/App.tsx")
-            elif any(mentioned_file in file_path or file_path.endswith(mentioned_file) 
-                    for mentioned_file in mentioned_files):
-                should_cite = True
-            # Match 5: If answer mentions the file but in a different format
-            elif any(mentioned_filename == filename for mentioned_filename in mentioned_filenames):
-                should_cite = True
+            should_cite = path_mentioned.get(file_path)
+            if should_cite is None:
+                should_cite = self._is_file_mentioned(
+                    file_path, mentions_by_filename, mentioned_components, mentioned_filenames
+                )
+                path_mentioned[file_path] = should_cite
             
             # Add citation if matched and not duplicate
             if should_cite:
                 key = (file_path, start_line)
-                if key not in seen_keys:
-                    seen_keys.add(key)
-                    citations.append({
+                if key not in citations:
+                    citations[key] = {
                         'file_path': file_path,
                         'start_line': start_line,
                         'end_line': end_line,
                         'text_snippet': ''
-                    })
+                    }
         
         # Strategy 4: If still no citations but we have chunks, use top chunks
-        # (since they were used to generate the answer)
-        if not citations and retrieved_chunks:
-            # Use top 5 chunks as citations
-            for chunk in retrieved_chunks[:5]:
-                file_path = chunk.get('file_path', chunk.get('metadata', {}).get('file_path', ''))
-                if file_path:
-                    start_line = chunk.get('start_line', chunk.get('metadata', {}).get('start_line', 0))
-                    end_line = chunk.get('end_line', chunk.get('metadata', {}).get('end_line', 0))
-                    key = (file_path, start_line)
-                    if key not in seen_keys:
-                        seen_keys.add(key)
-                        citations.append({
-                            'file_path': file_path,
-                            'start_line': start_line,
-                            'end_line': end_line,
-                            'text_snippet': ''
-                        })
+        if not citations:
+            return self._top_chunk_citations(locations)
         
-        return citations
+        return list(citations.values())
     
-    def enhance_citations(
-        self,
-        citations: List[Dict],
-        repo_id: str
-    ) -> List[Dict]:
+    @staticmethod
+    def _top_chunk_citations(locations: List[tuple]) -> List[Dict]:
         """
-        Enhance citations with actual code snippets.
+        Cite the top 5 retrieved chunks (they were used to generate the answer).
         
         Args:
-            citations: List of citation dictionaries
-            repo_id: Repository ID
+            locations: (file_path, start_line, end_line) of each retrieved chunk, in rank order
         
         Returns:
-            List of enhanced citations with text snippets
+            List of citations
         """
-        enhanced = []
-        for citation in citations:
-            enhanced_citation = self._enhance_single_citation(citation, repo_id)
-            enhanced.append(enhanced_citation)
-        return enhanced
+        citations = {}
+        for file_path, start_line, end_line in locations[:5]:
+            if file_path:
+                key = (file_path, start_line)
+                if key not in citations:
+                    citations[key] = {
+                        'file_path': file_path,
+                        'start_line': start_line,
+                        'end_line': end_line,
+                        'text_snippet': ''
+                    }
+        return list(citations.values())
+    
+    @staticmethod
+    def _is_file_mentioned(
+        file_path: str,
+        mentions_by_filename: Dict[str, List[str]],
+        mentioned_components: Set[str],
+        mentioned_filenames: Set[str]
+    ) -> bool:
+        """
+        Check whether an answer's file, component, or filename mentions refer to file_path.
+        
+        Args:
+            file_path: Path of a retrieved chunk
+            mentions_by_filename: Mentioned file paths keyed by their file name
+            mentioned_components: Mentioned component/class names
+            mentioned_filenames: Mentioned file names without directories
+        """
+        filename = _basename(file_path)
+        
+        # Match 1: Filename match (e.g., "main.py" written without its directory)
+        if filename in mentioned_filenames:
+            return True
+        
+        # Match 2: Component name matches filename (e.g., "EmergencyButton" matches "EmergencyButton.tsx")
+        if mentioned_components and os.path.splitext(filename)[0] in mentioned_components:
+            return True
+        
+        # Match 3: Exact or partial path match (e.g., "components/App.tsx"
+        # matches "src/components/App.tsx")
+        return any(file_path.endswith(mentioned_file) for mentioned_file in mentions_by_filename.get(filename, ()))
     
-    def _enhance_single_citation(
+    def enhance_citations(
         self,
-        citation: Dict,
+        citations: List[Dict],
         repo_id: str
-    ) -> Dict:
+    ) -> List[Dict]:
         """
-        Enhance a single citation with code snippet.
+        Enhance citations with actual code snippets.
+        
+        Snippets are memoized per (repo, file, span), so citations repeated
+        across verification retries are not re-read or re-sliced. Read
+        failures are not memoized. When several files are cited they are
+        read concurrently first.
         
         Args:
-            citation: Citation dictionary
+            citations: List of citation dictionaries
             repo_id: Repository ID
         
         Returns:
-            Enhanced citation dictionary
+            List of enhanced citations with text snippets (in input order)
         """
-        try:
-            snippet = open_span(
-                repo_id,
-                citation['file_path'],
-                citation['start_line'],
-                citation['end_line']
-            )
-            
-            # Limit snippet length
-            if len(snippet) > DEFAULT_SNIPPET_LENGTH:
-                snippet = snippet[:DEFAULT_SNIPPET_LENGTH] + "..."
-            
-            return {
-                **citation,
-                'text_snippet': snippet
-            }
-        except Exception:
-            # If we can't get the snippet, keep the citation without it
-            return {
-                **citation,
-                'text_snippet': '[Code snippet unavailable]'
-            }
+        unreadable = set()
+        
+        # File reads are independent I/O, so overlap them when many files are cited
+        file_paths = list(dict.fromkeys(c['file_path'] for c in citations if c.get('file_path')))
+        if len(file_paths) >= PARALLEL_SNIPPET_MIN_FILES:
+            _prefetch_files(repo_id, file_paths, unreadable)
+        
+        return [
+            {**citation, 'text_snippet': _citation_snippet(repo_id, citation, unreadable)}
+            for citation in citations
+        ]
     
     def format_citations_for_answer(self, citations: List[Dict]) -> str:
         """
@@ -211,26 +349,26 @@ class CitationService:
         # Group citations by file
         grouped = self._group_citations_by_file(citations)
         
-        reference_section = "\n\n### References:\n"
+        parts = ["\n\n### References:\n"]
         
         for file_path, file_citations in grouped.items():
-            reference_section += f"\n**{file_path}**\n"
+            parts.append(f"\n**{file_path}**\n")
             for citation in file_citations:
                 line_range = (
                     f"{citation['start_line']}-{citation['end_line']}"
                     if citation['start_line'] != citation['end_line']
                     else str(citation['start_line'])
                 )
-                reference_section += f"  - Lines {line_range}"
-                if citation.get('text_snippet') and citation['text_snippet'] != '[Code snippet unavailable]':
+                parts.append(f"  - Lines {line_range}")
+                if citation.get('text_snippet') and citation['text_snippet'] != SNIPPET_UNAVAILABLE:
                     # Show a preview of the code
                     snippet_preview = citation['text_snippet'][:100].replace('\n', ' ')
                     if len(citation['text_snippet']) > 100:
                         snippet_preview += "..."
-                    reference_section += f": `{snippet_preview}`"
-                reference_section += "\n"
+                    parts.append(f": `{snippet_preview}`")
+                parts.append("\n")
         
-        return reference_section
+        return "".join(parts)
     
     def _group_citations_by_file(self, citations: List[Dict]) -> Dict[str, List[Dict]]:
         """
@@ -242,18 +380,17 @@ class CitationService:
         Returns:
             Dictionary mapping file paths to lists of citations
         """
-        grouped = {}
+        grouped = defaultdict(list)
         for citation in citations:
-            file_path = citation.get('file_path', 'unknown')
-            if file_path not in grouped:
-                grouped[file_path] = []
-            grouped[file_path].append(citation)
+            grouped[citation.get('file_path', 'unknown')].append(citation)
         
-        # Sort citations within each file by line number
-        for file_path in grouped:
-            grouped[file_path].sort(key=lambda c: c.get('start_line', 0))
+        # Sort citations within each file by line number (callers format
+        # start_line directly, so every citation has one)
+        sort_key = itemgetter('start_line')
+        for file_citations in grouped.values():
+            file_citations.sort(key=sort_key)
         
-        return grouped
+        return dict(grouped)
     
     def extract_summary(self, answer_text: str, max_sentences: int = 2) -> tuple:
         """
@@ -266,32 +403,32 @@ class CitationService:
         Returns:
             Tuple of (summary_text, remaining_text_without_summary)
         """
-        import re
-        
         # Remove common prefixes like "Brief Summary:", "Summary:", etc.
-        cleaned_text = re.sub(r'^(Brief\s+)?Summary:\s*', '', answer_text, flags=re.IGNORECASE)
+        cleaned_text = _SUMMARY_PREFIX_PATTERN.sub('', answer_text)
         
         # Remove citations for sentence splitting
-        text_without_citations = re.sub(r'\[[^\]]+:\d+(?:-\d+)?\]', '', cleaned_text)
-        
-        # Split into sentences (preserve punctuation)
-        # Use a pattern that captures sentence endings
-        sentence_pattern = r'([^.!?]+[.!?]+)'
-        sentences = re.findall(sentence_pattern, text_without_citations)
-        
-        # Clean up sentences
-        sentences = [s.strip() for s in sentences if s.strip() and len(s.strip()) > 10]
+        text_without_citations = _INLINE_CITATION_PATTERN.sub('', cleaned_text)
+        
+        # Split into sentences (preserve punctuation). Only the summary
+        # sentences and the first remaining one are used, so stop there.
+        sentences = []
+        for match in _SENTENCE_PATTERN.finditer(text_without_citations):
+            sentence = match.group(1).strip()
+            if len(sentence) > 10:
+                sentences.append(sentence)
+                if len(sentences) > max_sentences:
+                    break
         
         if not sentences:
             # Fallback: split by periods
-            sentences = re.split(r'\.+', text_without_citations)
+            sentences = _PERIODS_PATTERN.split(text_without_citations)
             sentences = [s.strip() + '.' for s in sentences if s.strip() and len(s.strip()) > 10]
         
         if len(sentences) <= max_sentences:
             # All text is summary, return it all as summary with empty remaining
             summary = ' '.join(sentences).strip()
             # Remove "Brief Summary:" if it appears
-            summary = re.sub(r'^(Brief\s+)?Summary:\s*', '', summary, flags=re.IGNORECASE)
+            summary = _SUMMARY_PREFIX_PATTERN.sub('', summary)
             return summary, ""
         
         # Extract summary sentences
@@ -300,8 +437,8 @@ class CitationService:
         
         summary = ' '.join(summary_sentences).strip()
         # Remove "Brief Summary:" prefix if present
-        summary = re.sub(r'^(Brief\s+)?Summary:\s*', '', summary, flags=re.IGNORECASE)
-        if not summary.endswith('.') and not summary.endswith('!') and not summary.endswith('?'):
+        summary = _SUMMARY_PREFIX_PATTERN.sub('', summary)
+        if not summary.endswith(('.', '!', '?')):
             summary += '.'
         
         # Find where summary ends in original text to preserve citations
@@ -327,12 +464,10 @@ class CitationService:
                 # Count characters in summary and find similar position
                 summary_length = len(summary)
                 # Look for a good split point (after summary, before remaining)
-                # Find first sentence break after summary length
-                for i in range(summary_length, min(summary_length + 200, len(cleaned_text))):
-                    if cleaned_text[i] in '.!?' and i + 1 < len(cleaned_text):
-                        if cleaned_text[i + 1] in ' \n':
-                            remaining_text = cleaned_text[i + 1:].strip()
-                            break
+                # Find first sentence break starting within 200 characters after the summary
+                match = _SENTENCE_BREAK_PATTERN.search(cleaned_text, summary_length, summary_length + 201)
+                if match:
+                    remaining_text = cleaned_text[match.end():].strip()
         else:
             # If we can't find remaining, just use everything after first paragraph
             # Look for double newline or significant break
@@ -359,13 +494,13 @@ class CitationService:
         """
         snippets_with_code = [
             c for c in citations
-            if c.get('text_snippet') and c['text_snippet'] != '[Code snippet unavailable]'
+            if c.get('text_snippet') and c['text_snippet'] != SNIPPET_UNAVAILABLE
         ][:max_snippets]
         
         if not snippets_with_code:
             return ""
         
-        snippets_section = "\n\n### Code Examples:\n"
+        parts = ["\n\n### Code Examples:\n"]
         
         for i, citation in enumerate(snippets_with_code, 1):
             file_path = citation.get('file_path', 'unknown')
@@ -375,14 +510,14 @@ class CitationService:
                 else str(citation['start_line'])
             )
             
-            snippets_section += f"\n**Example {i}: {file_path} (lines {line_range})**\n"
-            snippets_section += "```\n"
-            snippets_section += citation['text_snippet']
+            parts.append(f"\n**Example {i}: {file_path} (lines {line_range})**\n")
+            parts.append("```\n")
+            parts.append(citation['text_snippet'])
             if not citation['text_snippet'].endswith('\n'):
-                snippets_section += "\n"
-            snippets_section += "```\n"
+                parts.append("\n")
+            parts.append("```\n")
         
-        return snippets_section
+        return "".join(parts)
     
     def remove_redundant_citations(self, answer_text: str, citations: List[Dict]) -> tuple:
         """
@@ -395,31 +530,26 @@ class CitationService:
         Returns:
             Tuple of (cleaned_answer, unique_citations)
         """
-        import re
-        
         # Extract all citation patterns from answer
-        citation_pattern = r'\[([^\]]+?):(\d+)(?:-(\d+))?\]'
-        matches = re.findall(citation_pattern, answer_text)
+        matches = _BRACKET_CITATION_PATTERN.findall(answer_text)
         
-        # Create set of unique citations
+        # Index citations once; the first citation for a span wins
+        citation_index = {}
+        for citation in citations:
+            citation_index.setdefault((citation.get('file_path'), citation.get('start_line')), citation)
+        
+        # Create list of unique citations in answer order
         seen_citations = set()
         unique_citations = []
-        citation_map = {}
         
         for match in matches:
-            file_path = match[0].strip()
-            start_line = int(match[1])
-            key = (file_path, start_line)
+            key = (match[0].strip(), int(match[1]))
             
             if key not in seen_citations:
                 seen_citations.add(key)
-                # Find matching citation in list
-                for citation in citations:
-                    if (citation.get('file_path') == file_path and 
-                        citation.get('start_line') == start_line):
-                        unique_citations.append(citation)
-                        citation_map[key] = citation
-                        break
+                citation = citation_index.get(key)
+                if citation is not None:
+                    unique_citations.append(citation)
         
         # If we have unique citations, use them; otherwise use all citations
         if unique_citations:
@@ -446,6 +576,11 @@ class CitationService:
         Returns:
             Post-processed answer
         """
+        # Already structured (e.g. a finalized answer passed through again):
+        # re-processing would only nest a second summary and reference list
+        if answer_text.startswith("**Summary:**") and "\n### References:\n" in answer_text:
+            return answer_text
+        
         # Remove redundant citations
         cleaned_answer, unique_citations = self.remove_redundant_citations(answer_text, citations)
         
@@ -468,12 +603,10 @@ class CitationService:
         # 2. Main answer (with citations preserved)
         if main_answer:
             # Format "Detailed Explanation:" on a new line if present
-            import re
-            # Check if answer starts with "Detailed Explanation:" or similar
-            detailed_pattern = r'^(Detailed\s+)?Explanation:\s*'
-            if re.match(detailed_pattern, main_answer, re.IGNORECASE):
+            match = _DETAILED_PREFIX_PATTERN.match(main_answer)
+            if match:
                 # Remove the prefix and add it on a new line
-                main_answer = re.sub(detailed_pattern, '', main_answer, flags=re.IGNORECASE).strip()
+                main_answer = main_answer[match.end():].strip()
                 parts.append("**Detailed Explanation:**\n" + main_answer)
             else:
                 parts.append(main_answer)
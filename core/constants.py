@@ -1,5 +1,6 @@
 """Application-wide constants."""
-from typing import Dict, List
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, Tuple
 
 # Default configuration values
 DEFAULT_MAX_RETRIEVAL_ITERATIONS = 3
@@ -8,7 +9,14 @@ DEFAULT_CHUNK_SIZE = 1200
 DEFAULT_CHUNK_OVERLAP = 200
 DEFAULT_MAX_CITATIONS = 15
 DEFAULT_QUERY_VARIATIONS = 3  # Number of query variations for multi-query retrieval
+MAX_QUERY_VARIATIONS = 12  # Upper bound on unique queries searched per retrieval iteration
+MIN_LLM_VARIATION_WORDS = 6  # Shorter questions use rule-based variations only
+MIN_PLANNED_QUERIES = 2  # Planner query count that already provides enough diversity
 DEFAULT_SNIPPET_LENGTH = 300
+SNIPPET_UNAVAILABLE = "[Code snippet unavailable]"  # Placeholder for citations whose file cannot be read
+MAX_CACHED_ANSWER_LENGTH = 32000  # Longer answers are parsed for citations without memoizing
+PARALLEL_SNIPPET_MIN_FILES = 4  # Cited files needed before snippet files are read concurrently
+MAX_SNIPPET_READ_WORKERS = 8  # Maximum concurrent file reads when enhancing citations
 MIN_CHUNK_SIZE_TOKENS = 50  # Minimum tokens before merging small chunks
 MAX_CONTEXT_LINES = 10  # Maximum lines to look back for comments/docstrings
 
@@ -23,6 +31,12 @@ PLANNER_TEMPERATURE = 0.0
 SYNTHESIZER_TEMPERATURE = 0.0
 VERIFIER_TEMPERATURE = 0.0
 SUMMARY_TEMPERATURE = 0.3
+SUMMARY_CACHE_TTL_SECONDS = 3600  # Architecture summaries are sampled (not LLM-cached), so reuse them this long
+SUMMARY_CACHE_SIZE = 64  # Maximum cached architecture summaries
+
+# Structural verification (skips the verifier LLM call for fully cited answers)
+STRUCTURAL_VERIFY_MIN_COVERAGE = 0.9  # Fraction of substantive sentences that must carry a citation
+STRUCTURAL_VERIFY_MIN_WORDS = 4  # Shorter sentences (headings, list labels) need no citation
 
 # Search configuration
 VECTOR_SEARCH_WEIGHT = 0.7
@@ -37,84 +51,84 @@ DOC_FILE_PENALTY = -0.15  # Penalty for documentation files when searching imple
 PATH_DEPTH_BOOST = 0.05  # Boost per level closer to root (max 3 levels)
 
 # Test file patterns
-TEST_FILE_PATTERNS: List[str] = [
+TEST_FILE_PATTERNS: Tuple[str, ...] = (
     'test_', '_test', 'spec_', '_spec', '.test.', '.spec.',
     'tests/', 'test/', '__tests__/', 'specs/', 'spec/'
-]
+)
 
 # Documentation file patterns
-DOC_FILE_PATTERNS: List[str] = [
+DOC_FILE_PATTERNS: Tuple[str, ...] = (
     'readme', 'changelog', 'license', 'contributing', 'docs/',
     'documentation/', '.md', '.txt', '.rst'
-]
+)
 
 # Key file patterns for repository analysis
-KEY_FILE_PATTERNS: List[str] = [
+KEY_FILE_PATTERNS: Tuple[str, ...] = (
     'main.py', 'app.py', '__init__.py', 'index.js', 'index.ts',
     'server.py', 'server.js', 'api.py', 'routes.py', 'views.py',
     'Main.java', 'Application.java', 'main.go', 'README.md'
-]
+)
 
 # Stop words for keyword extraction
-STOP_WORDS: set = {
+STOP_WORDS: FrozenSet[str] = frozenset({
     'how', 'what', 'where', 'when', 'why', 'who', 'which', 'is', 'are', 'the',
     'a', 'an', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'from',
     'does', 'do', 'did', 'can', 'could', 'would', 'should', 'will', 'be'
-}
+})
 
-# Query expansion synonyms for common technical terms
-QUERY_EXPANSIONS: Dict[str, List[str]] = {
+# Query expansion synonyms for common technical terms (read-only)
+QUERY_EXPANSIONS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
     # Authentication & Security
-    'auth': ['authentication', 'login', 'session', 'token', 'jwt', 'oauth', 'credential'],
-    'authentication': ['auth', 'login', 'session', 'token', 'jwt', 'oauth', 'credential'],
-    'login': ['authentication', 'auth', 'session', 'credential', 'signin'],
-    'session': ['authentication', 'auth', 'login', 'token', 'cookie'],
-    'token': ['jwt', 'authentication', 'auth', 'session', 'bearer'],
+    'auth': ('authentication', 'login', 'session', 'token', 'jwt', 'oauth', 'credential'),
+    'authentication': ('auth', 'login', 'session', 'token', 'jwt', 'oauth', 'credential'),
+    'login': ('authentication', 'auth', 'session', 'credential', 'signin'),
+    'session': ('authentication', 'auth', 'login', 'token', 'cookie'),
+    'token': ('jwt', 'authentication', 'auth', 'session', 'bearer'),
     
     # Database & Storage
-    'database': ['db', 'datastore', 'storage', 'persistence', 'repository'],
-    'db': ['database', 'datastore', 'storage', 'persistence'],
-    'query': ['search', 'filter', 'select', 'find', 'retrieve'],
-    'storage': ['database', 'db', 'persistence', 'cache'],
+    'database': ('db', 'datastore', 'storage', 'persistence', 'repository'),
+    'db': ('database', 'datastore', 'storage', 'persistence'),
+    'query': ('search', 'filter', 'select', 'find', 'retrieve'),
+    'storage': ('database', 'db', 'persistence', 'cache'),
     
     # API & HTTP
-    'api': ['endpoint', 'route', 'handler', 'controller', 'service'],
-    'endpoint': ['api', 'route', 'handler', 'controller'],
-    'route': ['endpoint', 'api', 'handler', 'path', 'url'],
-    'request': ['http', 'api', 'endpoint', 'call'],
-    'response': ['return', 'output', 'result', 'reply'],
+    'api': ('endpoint', 'route', 'handler', 'controller', 'service'),
+    'endpoint': ('api', 'route', 'handler', 'controller'),
+    'route': ('endpoint', 'api', 'handler', 'path', 'url'),
+    'request': ('http', 'api', 'endpoint', 'call'),
+    'response': ('return', 'output', 'result', 'reply'),
     
     # Error Handling
-    'error': ['exception', 'failure', 'issue', 'problem', 'bug'],
-    'exception': ['error', 'failure', 'throw', 'catch'],
-    'validation': ['validate', 'check', 'verify', 'sanitize'],
+    'error': ('exception', 'failure', 'issue', 'problem', 'bug'),
+    'exception': ('error', 'failure', 'throw', 'catch'),
+    'validation': ('validate', 'check', 'verify', 'sanitize'),
     
     # Configuration & Setup
-    'config': ['configuration', 'settings', 'options', 'parameters'],
-    'setup': ['initialize', 'configure', 'install', 'bootstrap'],
-    'init': ['initialize', 'setup', 'bootstrap', 'start'],
+    'config': ('configuration', 'settings', 'options', 'parameters'),
+    'setup': ('initialize', 'configure', 'install', 'bootstrap'),
+    'init': ('initialize', 'setup', 'bootstrap', 'start'),
     
     # Data Processing
-    'process': ['handle', 'execute', 'run', 'perform', 'do'],
-    'handle': ['process', 'manage', 'deal', 'execute'],
-    'transform': ['convert', 'change', 'modify', 'map'],
+    'process': ('handle', 'execute', 'run', 'perform', 'do'),
+    'handle': ('process', 'manage', 'deal', 'execute'),
+    'transform': ('convert', 'change', 'modify', 'map'),
     
     # Testing
-    'test': ['testing', 'spec', 'unit', 'integration', 'assert'],
-    'testing': ['test', 'spec', 'unit', 'integration'],
+    'test': ('testing', 'spec', 'unit', 'integration', 'assert'),
+    'testing': ('test', 'spec', 'unit', 'integration'),
     
     # Common patterns
-    'middleware': ['interceptor', 'filter', 'handler', 'processor'],
-    'service': ['api', 'handler', 'controller', 'manager'],
-    'model': ['schema', 'entity', 'data', 'structure'],
-    'view': ['template', 'render', 'display', 'ui'],
-    'controller': ['handler', 'endpoint', 'route', 'service'],
-}
+    'middleware': ('interceptor', 'filter', 'handler', 'processor'),
+    'service': ('api', 'handler', 'controller', 'manager'),
+    'model': ('schema', 'entity', 'data', 'structure'),
+    'view': ('template', 'render', 'display', 'ui'),
+    'controller': ('handler', 'endpoint', 'route', 'service'),
+})
 
 # File patterns to ignore
-IGNORED_PATTERNS: List[str] = [
+IGNORED_PATTERNS: FrozenSet[str] = frozenset({
     '.git', '__pycache__', 'node_modules', 'venv', '.env', '.DS_Store'
-]
+})
 
 # Error messages
 ERROR_REPO_NOT_FOUND = "Repository not found: {repo_id}"
@@ -1,4 +1,5 @@
 """Context window optimization for managing chunk prioritization and truncation."""
+import re
 from typing import List, Dict, Optional, Tuple
 from indexing.chunking import count_tokens
 from core.constants import (
@@ -12,6 +13,14 @@ from core.constants import (
     MIN_CHUNK_TOKENS_AFTER_TRUNCATION
 )
 
+# Shared default for chunks without metadata (never mutated)
+_EMPTY = {}
+
+# Substring patterns folded into one regex each, so a path is scanned once
+_TEST_FILE_PATTERN = re.compile('|'.join(map(re.escape, TEST_FILE_PATTERNS)))
+_DOC_FILE_PATTERN = re.compile('|'.join(map(re.escape, DOC_FILE_PATTERNS)))
+_KEY_FILE_PATTERN = re.compile('|'.join(re.escape(pattern.lower()) for pattern in KEY_FILE_PATTERNS))
+
 
 def optimize_chunks_for_context(
     chunks: List[Dict],
@@ -23,6 +32,10 @@ def optimize_chunks_for_context(
     """
     Optimize chunks for context window by prioritizing and truncating intelligently.
     
+    Chunks are packed greedily by priority until the token budget is spent,
+    then the selection is ordered by file and line so code from the same
+    file reads contiguously in the prompt.
+    
     Args:
         chunks: List of chunk dictionaries with 'chunk_text' or 'text', scores, and metadata
         max_context_tokens: Maximum context window size in tokens
@@ -31,7 +44,7 @@ def optimize_chunks_for_context(
         question: Optional question text for relevance-based prioritization
     
     Returns:
-        Optimized list of chunks (prioritized and truncated if needed)
+        Optimized list of chunks (selected, truncated if needed, in file order)
     """
     if not chunks:
         return chunks
@@ -42,21 +55,21 @@ def optimize_chunks_for_context(
     # Step 1: Prioritize chunks
     prioritized_chunks = _prioritize_chunks(chunks, question)
     
-    # Step 2: Calculate total tokens needed
-    total_tokens = sum(_get_chunk_token_count(chunk) for chunk in prioritized_chunks)
+    # Step 2: Calculate total tokens needed (counted once per chunk)
+    total_tokens = sum(chunk['_token_count'] for chunk in prioritized_chunks)
     
-    # Step 3: If within limit, return as-is (clean up internal fields)
+    # Step 3: If within limit keep everything, otherwise select and truncate to fit
     if total_tokens <= available_tokens:
-        return _clean_chunks(prioritized_chunks)
-    
-    # Step 4: Select and truncate chunks to fit
-    optimized_chunks = _select_and_truncate_chunks(
-        prioritized_chunks,
-        available_tokens,
-        question
-    )
-    
-    return _clean_chunks(optimized_chunks)
+        optimized_chunks = prioritized_chunks
+    else:
+        optimized_chunks = _select_and_truncate_chunks(
+            prioritized_chunks,
+            available_tokens,
+            question
+        )
+    
+    # Step 4: Linearize and clean up internal fields
+    return _clean_chunks(_linearize_chunks(optimized_chunks))
 
 
 def _prioritize_chunks(chunks: List[Dict], question: Optional[str] = None) -> List[Dict]:
@@ -84,7 +97,8 @@ def _prioritize_chunks(chunks: List[Dict], question: Optional[str] = None) -> Li
         priority_score = _calculate_priority_score(chunk, question)
         prioritized.append({
             **chunk,
-            '_priority_score': priority_score
+            '_priority_score': priority_score,
+            '_token_count': _get_chunk_token_count(chunk)
         })
     
     # Sort by priority score (highest first)
@@ -117,14 +131,15 @@ def _calculate_priority_score(chunk: Dict, question: Optional[str] = None) -> fl
         score += 2.0  # Significant boost for multi-source matches
     
     # Boost for key files
-    file_path = chunk.get('file_path', chunk.get('metadata', {}).get('file_path', ''))
+    metadata = chunk.get('metadata') or _EMPTY
+    file_path = chunk.get('file_path', metadata.get('file_path', ''))
     if file_path:
         filename = file_path.split('/')[-1].split('\\')[-1].lower()
-        if any(pattern.lower() in filename for pattern in KEY_FILE_PATTERNS):
+        if _KEY_FILE_PATTERN.search(filename):
             score += 1.5
     
     # Boost for chunks with symbols (functions/classes)
-    symbol_name = chunk.get('symbol_name', chunk.get('metadata', {}).get('symbol_name'))
+    symbol_name = chunk.get('symbol_name', metadata.get('symbol_name'))
     if symbol_name:
         score += 1.0
     
@@ -159,16 +174,14 @@ def _is_test_file(file_path: str) -> bool:
     """Check if file is a test file."""
     if not file_path:
         return False
-    file_path_lower = file_path.lower()
-    return any(pattern in file_path_lower for pattern in TEST_FILE_PATTERNS)
+    return _TEST_FILE_PATTERN.search(file_path.lower()) is not None
 
 
 def _is_doc_file(file_path: str) -> bool:
     """Check if file is a documentation file."""
     if not file_path:
         return False
-    file_path_lower = file_path.lower()
-    return any(pattern in file_path_lower for pattern in DOC_FILE_PATTERNS)
+    return _DOC_FILE_PATTERN.search(file_path.lower()) is not None
 
 
 def _select_and_truncate_chunks(
@@ -320,13 +333,15 @@ def _truncate_chunk_intelligently(
         truncated_text += "\n# ... [truncated for context window] ..."
     
     # Create truncated chunk
+    truncated_token_count = count_tokens(truncated_text)
     truncated_chunk = {
         **chunk,
         'text': truncated_text,
         'chunk_text': truncated_text,
         '_truncated': True,
-        '_original_token_count': count_tokens(chunk_text),
-        '_truncated_token_count': count_tokens(truncated_text)
+        '_original_token_count': chunk.get('_token_count', count_tokens(chunk_text)),
+        '_truncated_token_count': truncated_token_count,
+        '_token_count': truncated_token_count
     }
     
     return truncated_chunk
@@ -388,6 +403,26 @@ def _identify_important_lines(lines: List[str], question: Optional[str] = None)
     return sorted(set(important))
 
 
+def _linearize_chunks(chunks: List[Dict]) -> List[Dict]:
+    """
+    Order chunks by file path and start line.
+    
+    Args:
+        chunks: Selected chunks
+    
+    Returns:
+        Chunks in reading order
+    """
+    def position(chunk: Dict) -> Tuple[str, int]:
+        metadata = chunk.get('metadata') or {}
+        return (
+            chunk.get('file_path', metadata.get('file_path', '')) or '',
+            chunk.get('start_line', metadata.get('start_line', 0)) or 0
+        )
+    
+    return sorted(chunks, key=position)
+
+
 def _get_chunk_token_count(chunk: Dict) -> int:
     """
     Get token count for a chunk.
@@ -398,25 +433,31 @@ def _get_chunk_token_count(chunk: Dict) -> int:
     Returns:
         Token count
     """
+    if '_token_count' in chunk:
+        return chunk['_token_count']
+    
     text = chunk.get('text', chunk.get('chunk_text', ''))
     if not text:
         return 0
     return count_tokens(text)
 
 
+_INTERNAL_FIELDS = frozenset({'_priority_score', '_token_count'})
+
+
 def _clean_chunks(chunks: List[Dict]) -> List[Dict]:
     """
-    Remove internal priority score field but keep useful metadata like _truncated.
+    Remove internal priority and token count fields but keep useful metadata like _truncated.
     
     Args:
         chunks: List of chunks with internal fields
     
     Returns:
-        Cleaned chunks without _priority_score but keeping _truncated
+        Cleaned chunks without _priority_score or _token_count but keeping _truncated
     """
     cleaned = []
     for chunk in chunks:
-        cleaned_chunk = {k: v for k, v in chunk.items() if k != '_priority_score'}
+        cleaned_chunk = {k: v for k, v in chunk.items() if k not in _INTERNAL_FIELDS}
         cleaned.append(cleaned_chunk)
     return cleaned
 
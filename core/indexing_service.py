@@ -2,6 +2,8 @@
 from typing import Optional
 from indexing.pipeline import index_repository, get_indexing_status
 from indexing.loader import generate_repo_id
+from core.citation_service import clear_citation_cache
+from agent.llm_cache import clear_llm_cache
 from core.exceptions import IndexingError
 from core.constants import ERROR_INDEXING_FAILED
 
@@ -54,6 +56,9 @@ class IndexingService:
                 local_path=local_path,
                 branch=branch
             )
+            # Drop cached file contents and answers from any previous index of this repo
+            clear_citation_cache()
+            clear_llm_cache()
             print(f"Indexing completed for {github_url or local_path}")
         except Exception as e:
             error_msg = ERROR_INDEXING_FAILED.format(error=str(e))
@@ -3,7 +3,7 @@ from abc import ABC, abstractmethod
 from typing import List, Optional
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import BaseMessage
-from agent.llm_wrapper import HuggingFaceChatLLM
+from agent.llm_wrapper import get_hf_chat
 from app.config import settings
 from core.constants import (
     PLANNER_TEMPERATURE,
@@ -23,9 +23,27 @@ class LLMServiceInterface(ABC):
         pass
     
     @abstractmethod
-    def invoke_text(self, text: str) -> str:
-        """Invoke the LLM with a text prompt."""
+    def invoke_text(self, text: str, system: Optional[str] = None) -> str:
+        """Invoke the LLM with a text prompt and optional static system instructions."""
         pass
+    
+    def invoke_text_safe(self, text: str, default: str, system: Optional[str] = None) -> str:
+        """
+        Invoke the LLM with a text prompt, returning a default on failure.
+        
+        Args:
+            text: Prompt text
+            default: Value returned if the invocation raises
+            system: Optional static system instructions
+        
+        Returns:
+            Response text or default
+        """
+        try:
+            return self.invoke_text(text, system)
+        except Exception as e:
+            print(f"Error invoking LLM: {e}")
+            return default
 
 
 class HuggingFaceLLMService(LLMServiceInterface):
@@ -40,10 +58,10 @@ class HuggingFaceLLMService(LLMServiceInterface):
             temperature: Temperature for generation
         """
         try:
-            self.llm = HuggingFaceChatLLM(
-                model=model,
-                huggingface_api_key=settings.huggingface_api_key,
-                temperature=temperature
+            self.llm = get_hf_chat(
+                model,
+                settings.huggingface_api_key,
+                temperature
             )
         except Exception as e:
             raise LLMError(f"Failed to initialize LLM: {e}")
@@ -56,10 +74,18 @@ class HuggingFaceLLMService(LLMServiceInterface):
         except Exception as e:
             raise LLMError(f"LLM invocation failed: {e}")
     
-    def invoke_text(self, text: str) -> str:
-        """Invoke the LLM with a text prompt."""
-        from langchain_core.messages import HumanMessage
-        return self.invoke([HumanMessage(content=text)])
+    def invoke_text(self, text: str, system: Optional[str] = None) -> str:
+        """
+        Invoke the LLM with a text prompt.
+        
+        Static instructions go in a separate system message ahead of the
+        dynamic prompt, so the identical prefix can hit provider prompt caches.
+        """
+        from langchain_core.messages import HumanMessage, SystemMessage
+        messages = [HumanMessage(content=text)]
+        if system:
+            messages.insert(0, SystemMessage(content=system))
+        return self.invoke(messages)
 
 
 class LLMServiceFactory:
@@ -1,9 +1,11 @@
 """Query variation generation for multi-query retrieval."""
 from typing import List, Dict, Optional, Set
 from core.llm_service import LLMServiceFactory
-from core.error_handler import safe_execute
 import json
 
+# Shared default for chunks without metadata (never mutated)
+_EMPTY = {}
+
 
 def generate_query_variations(
     question: str,
@@ -30,13 +32,25 @@ def generate_query_variations(
     if not question or not question.strip():
         return [question]
     
+    llm_variations = _generate_llm_variations(question, num_variations - 1) if use_llm else []
+    return _combine_variations(question, llm_variations, num_variations)
+
+
+def _combine_variations(question: str, llm_variations: List[str], num_variations: int) -> List[str]:
+    """
+    Merge LLM variations with rule-based ones and deduplicate.
+    
+    Args:
+        question: Original question
+        llm_variations: Variations produced by the LLM (may be empty)
+        num_variations: Number of variations to return
+    
+    Returns:
+        List of query variations (includes original question)
+    """
     # Always include original question
     variations = [question]
-    
-    if use_llm:
-        llm_variations = _generate_llm_variations(question, num_variations - 1)
-        if llm_variations:
-            variations.extend(llm_variations)
+    variations.extend(llm_variations)
     
     # Fallback or supplement with rule-based variations
     rule_variations = _generate_rule_based_variations(question, num_variations - len(variations))
@@ -69,7 +83,17 @@ def _generate_llm_variations(question: str, num_variations: int) -> List[str]:
     if num_variations <= 0:
         return []
     
-    prompt = f"""Generate {num_variations} diverse search query variations for this question about code.
+    try:
+        llm_service = LLMServiceFactory.create_planner_service()
+        response = llm_service.invoke_text_safe(_build_variation_prompt(question, num_variations), "[]")
+        return _parse_llm_variations(response, num_variations)
+    except Exception:
+        return []
+
+
+def _build_variation_prompt(question: str, num_variations: int) -> str:
+    """Build the LLM prompt asking for query variations."""
+    return f"""Generate {num_variations} diverse search query variations for this question about code.
 
 Original Question: {question}
 
@@ -104,26 +128,18 @@ Question: "How does error handling work?"
 ]
 
 Now generate {num_variations} variations for the question above. Output ONLY valid JSON array:"""
+
+
+def _parse_llm_variations(response: str, num_variations: int) -> List[str]:
+    """Parse and clean query variations from an LLM response."""
+    variations = _extract_json_array(response)
     
-    try:
-        llm_service = LLMServiceFactory.create_planner_service()
-        response = safe_execute(
-            lambda: llm_service.invoke_text(prompt),
-            default_return="[]"
-        )
-        
-        # Parse JSON response
-        variations = _extract_json_array(response)
-        
-        # Validate and clean variations
-        cleaned = []
-        for v in variations:
-            if isinstance(v, str) and v.strip() and len(v.strip()) > 5:
-                cleaned.append(v.strip())
-        
-        return cleaned[:num_variations]
-    except Exception:
-        return []
+    cleaned = []
+    for v in variations:
+        if isinstance(v, str) and v.strip() and len(v.strip()) > 5:
+            cleaned.append(v.strip())
+    
+    return cleaned[:num_variations]
 
 
 def _extract_json_array(text: str) -> List[str]:
@@ -300,11 +316,12 @@ def rewrite_queries_based_on_results(
     found_keywords = set()
     
     for chunk in retrieved_chunks:
-        file_path = chunk.get('file_path', chunk.get('metadata', {}).get('file_path', ''))
+        metadata = chunk.get('metadata') or _EMPTY
+        file_path = chunk.get('file_path', metadata.get('file_path', ''))
         if file_path:
             found_files.add(file_path.split('/')[-1].split('\\')[-1])
         
-        symbol = chunk.get('symbol_name', chunk.get('metadata', {}).get('symbol_name'))
+        symbol = chunk.get('symbol_name', metadata.get('symbol_name'))
         if symbol:
             found_symbols.add(symbol)
         
@@ -394,10 +411,7 @@ Generate {num_queries} queries:"""
     
     try:
         llm_service = LLMServiceFactory.create_planner_service()
-        response = safe_execute(
-            lambda: llm_service.invoke_text(prompt),
-            default_return="[]"
-        )
+        response = llm_service.invoke_text_safe(prompt, "[]")
         
         queries = _extract_json_array(response)
         return [q.strip() for q in queries if isinstance(q, str) and q.strip()][:num_queries]
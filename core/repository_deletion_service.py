@@ -2,6 +2,8 @@
 from indexing.metadata_store import get_metadata_store
 from indexing.vector_store import get_vector_store
 from core.repository_service import RepositoryService
+from core.citation_service import clear_citation_cache
+from agent.llm_cache import clear_llm_cache
 from core.exceptions import RepositoryNotFoundError
 from core.constants import MESSAGE_REPO_DELETED
 
@@ -37,4 +39,7 @@ class RepositoryDeletionService:
         vector_store = get_vector_store()
         vector_store.delete_collection(repo_id)
         
+        clear_citation_cache()
+        clear_llm_cache()
+        
         return MESSAGE_REPO_DELETED.format(repo_id=repo_id)
@@ -1,4 +1,5 @@
 """Local embedding generation using sentence-transformers."""
+import threading
 from typing import List
 import numpy as np
 from sentence_transformers import SentenceTransformer
@@ -17,13 +18,16 @@ class EmbeddingGenerator:
         """
         self.model_name = model_name or settings.embedding_model
         self._model = None
+        self._model_lock = threading.Lock()
     
     @property
     def model(self):
-        """Lazy load the model."""
+        """Lazy load the model (thread-safe, loaded once)."""
         if self._model is None:
-            print(f"Loading embedding model: {self.model_name}")
-            self._model = SentenceTransformer(self.model_name)
+            with self._model_lock:
+                if self._model is None:
+                    print(f"Loading embedding model: {self.model_name}")
+                    self._model = SentenceTransformer(self.model_name)
         return self._model
     
     def generate_embeddings(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
@@ -1,5 +1,6 @@
 """Metadata store using SQLite."""
 import sqlite3
+import threading
 import json
 from typing import List, Dict, Optional
 from pathlib import Path
@@ -322,11 +323,14 @@ class MetadataStore:
 
 # Global instance
 _metadata_store = None
+_metadata_store_lock = threading.Lock()
 
 
 def get_metadata_store() -> MetadataStore:
     """Get or create the global metadata store instance."""
     global _metadata_store
     if _metadata_store is None:
-        _metadata_store = MetadataStore()
+        with _metadata_store_lock:
+            if _metadata_store is None:
+                _metadata_store = MetadataStore()
     return _metadata_store
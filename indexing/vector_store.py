@@ -1,4 +1,5 @@
 """Vector store using ChromaDB."""
+import threading
 from typing import List, Dict, Optional
 import chromadb
 from chromadb.config import Settings as ChromaSettings
@@ -196,11 +197,14 @@ class VectorStore:
 
 # Global instance
 _vector_store = None
+_vector_store_lock = threading.Lock()
 
 
 def get_vector_store() -> VectorStore:
     """Get or create the global vector store instance."""
     global _vector_store
     if _vector_store is None:
-        _vector_store = VectorStore()
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = VectorStore()
     return _vector_store
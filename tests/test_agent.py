@@ -1,6 +1,37 @@
 """Tests for the agent."""
+import asyncio
+import json
+import threading
+import time
 import pytest
-from agent.prompts import extract_citations, extract_json_from_response
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.graph import StateGraph, END
+import agent.prompts as agent_prompts
+from agent.prompts import (
+    extract_citations,
+    extract_json_from_response,
+    get_synthesizer_prompt,
+    get_verifier_prompt,
+    parse_model_response,
+    Plan,
+    SynthesisWithVerification,
+    Verification,
+    VERIFIER_INSTRUCTIONS
+)
+from agent.llm_cache import LLMResponseCache
+import agent.llm_wrapper as llm_wrapper
+from agent.llm_wrapper import _iter_sse_deltas, HuggingFaceChatLLM
+from agent.nodes.synth_verify import _synthesize_and_verify
+from agent.nodes.verifier import _structural_verify
+from agent.graph import create_agent_graph, create_simple_agent_graph, rebuild_graphs
+from agent.state import AgentState
+import core.architecture_service as architecture_service
+import core.citation_service as citation_service
+from core.citation_service import CitationService, clear_citation_cache
+from core.constants import SNIPPET_UNAVAILABLE
+from core.agent_service import AgentService
+from core.llm_service import HuggingFaceLLMService
 
 
 def test_extract_citations():
@@ -17,6 +48,25 @@ def test_extract_citations():
     assert citations[0]['start_line'] == 10
     assert citations[0]['end_line'] == 25
     assert citations[1]['file_path'] == 'utils/crypto.py'
+    
+    # Parenthesized and bare citations, duplicates dropped
+    answer = "See (api/routes.ts:7), core/db.go:3-9; and again (core/db.go:3)."
+    citations = extract_citations(answer)
+    assert [(c['file_path'], c['start_line'], c['end_line']) for c in citations] == [
+        ('api/routes.ts', 7, 7), ('core/db.go', 3, 3)
+    ]
+    
+    # Answers without any ':' cannot contain a citation
+    assert extract_citations("Not found in the retrieved code.") == []
+    
+    # Long dotted identifiers are scanned in linear time
+    assert extract_citations(".".join(["ab"] * 20000) + " and app/main.py:1") == [
+        {'file_path': 'app/main.py', 'start_line': 1, 'end_line': 1, 'text_snippet': ''}
+    ]
+    
+    # Memoized results are never shared between callers
+    citations[0]['text_snippet'] = 'mutated'
+    assert extract_citations(answer)[0]['text_snippet'] == ''
 
 
 def test_extract_json_from_response():
@@ -35,6 +85,454 @@ def test_extract_json_from_response():
     response = 'Here is the JSON: {"key": "value"} and more text'
     result = extract_json_from_response(response)
     assert result == {"key": "value"}
+    
+    # Test with a fenced block inside surrounding text
+    response = 'Plan:\n```json\n{"key": {"nested": [1, 2]}}\n```\nDone {not json}'
+    result = extract_json_from_response(response)
+    assert result == {"key": {"nested": [1, 2]}}
+    
+    # Test braces inside strings and trailing brace-heavy text
+    response = 'Result: {"code": "if (x) { return \\"}\\" }"} then {x} and }'
+    result = extract_json_from_response(response)
+    assert result == {"code": 'if (x) { return "}" }'}
+    
+    # Test skipping a non-JSON brace group before the object
+    assert extract_json_from_response('Set {a, b}: {"key": 1}') == {"key": 1}
+    
+    # Test an object after an unclosed brace
+    assert extract_json_from_response('{"unclosed": {"key": 1}') == {"key": 1}
+    
+    # Test unparseable response
+    assert extract_json_from_response("no json here") == {}
+
+
+def test_extract_json_from_response_json_fallback(monkeypatch):
+    """Test JSON extraction with the standard json parser (no orjson)."""
+    monkeypatch.setattr(agent_prompts, '_json_loads', json.loads)
+    
+    assert extract_json_from_response('{"key": "value"}') == {"key": "value"}
+    assert extract_json_from_response('```\n{"key": "value"}\n```') == {"key": "value"}
+    assert extract_json_from_response('text {"key": 1} text') == {"key": 1}
+    assert extract_json_from_response('{broken') == {}
+
+
+def test_parse_model_response():
+    """Test lenient parsing of planner and verifier JSON."""
+    # Null and missing fields take their defaults
+    plan = parse_model_response('{"reasoning": null, "search_queries": ["auth handler"]}', Plan)
+    assert plan.reasoning == "Direct search for question keywords"
+    assert plan.search_queries == ["auth handler"]
+    assert plan.expected_files == []
+    
+    # Claim objects are flattened to text instead of failing validation
+    verification = parse_model_response(
+        '{"is_grounded": false, "unsupported_claims": [{"claim": "x"}], "follow_up_queries": ["q"]}',
+        Verification
+    )
+    assert verification.is_grounded is False
+    assert verification.unsupported_claims == ["x"]
+    assert verification.follow_up_queries == ["q"]
+    
+    # A malformed field does not discard the valid ones
+    verification = parse_model_response(
+        'Result:\n```json\n{"is_grounded": false, "missing_information": {"a": 1}, "follow_up_queries": ["q"]}\n```',
+        Verification
+    )
+    assert verification.is_grounded is False
+    assert verification.missing_information == []
+    assert verification.follow_up_queries == ["q"]
+    
+    # Unparseable responses fall back to defaults
+    assert parse_model_response("not json", Verification).is_grounded is True
+
+
+def test_llm_response_cache(tmp_path):
+    """Test in-memory and on-disk LLM response caching."""
+    cache = LLMResponseCache(db_path=tmp_path / "llm_cache.db", max_memory_entries=1)
+    
+    assert cache.get("missing") is None
+    
+    cache.set("a", "answer a")
+    cache.set("b", "answer b")  # Evicts "a" from memory
+    assert cache.get("a") == "answer a"  # Served from disk
+    
+    # A fresh instance sees entries persisted by the first one
+    other = LLMResponseCache(db_path=tmp_path / "llm_cache.db")
+    assert other.get("b") == "answer b"
+    
+    cache.clear()
+    assert cache.get("a") is None
+
+
+
+def test_llm_response_cache_bounds_and_failures(tmp_path):
+    """Test the disk tier size bound and degraded mode on SQLite errors."""
+    cache = LLMResponseCache(db_path=tmp_path / "llm_cache.db", max_memory_entries=1, max_disk_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, f"answer {key}")
+    
+    other = LLMResponseCache(db_path=tmp_path / "llm_cache.db")
+    assert other.get("a") is None  # Oldest entry pruned from disk
+    assert other.get("b") == "answer b"
+    assert other.get("c") == "answer c"
+    
+    # An unusable database path degrades to a memory-only cache
+    broken = LLMResponseCache(db_path=tmp_path / "missing" / "llm_cache.db")
+    broken.set("k", "v")
+    assert broken.get("k") == "v"
+    broken.clear()
+    assert broken.get("k") is None
+
+
+def test_enhance_citations(monkeypatch):
+    """Test snippet extraction, input order, caching and invalidation."""
+    files = {'a.py': "line1\nline2\nline3", 'b.py': "only"}
+    reads = []
+    
+    def fake_open_file(repo_id, file_path):
+        reads.append(file_path)
+        if file_path not in files:
+            raise ValueError(f"File not found: {file_path}")
+        return files[file_path]
+    
+    monkeypatch.setattr(citation_service, 'open_file', fake_open_file)
+    clear_citation_cache()
+    
+    citations = [
+        {'file_path': 'b.py', 'start_line': 1, 'end_line': 1},
+        {'file_path': 'a.py', 'start_line': 2, 'end_line': 3},
+        {'file_path': 'missing.py', 'start_line': 1, 'end_line': 2},
+        {'file_path': 'a.py', 'start_line': 1},  # No end line
+        {'file_path': 'a.py', 'start_line': 1, 'end_line': 1},
+    ]
+    enhanced = CitationService().enhance_citations(citations, 'repo')
+    
+    assert [c['text_snippet'] for c in enhanced] == [
+        "only", "line2\nline3", SNIPPET_UNAVAILABLE, SNIPPET_UNAVAILABLE, "line1"
+    ]
+    assert reads.count('a.py') == 1  # Each file is read once
+    
+    # Repeated calls are served from the cache until it is cleared
+    CitationService().enhance_citations(citations[:2], 'repo')
+    assert reads.count('a.py') == 1
+    
+    files['a.py'] = "changed\nline2\nline3"
+    clear_citation_cache()
+    enhanced = CitationService().enhance_citations(citations[4:], 'repo')
+    assert enhanced[0]['text_snippet'] == "changed"
+    
+    # Read failures are not cached: a file that appears later is picked up
+    missing = [citations[2], citations[2]]
+    enhanced = CitationService().enhance_citations(missing, 'repo')
+    assert [c['text_snippet'] for c in enhanced] == [SNIPPET_UNAVAILABLE] * 2
+    assert reads.count('missing.py') == 2  # Once per call, not once per citation
+    
+    files['missing.py'] = "restored\nline2"
+    enhanced = CitationService().enhance_citations(missing, 'repo')
+    assert enhanced[0]['text_snippet'] == "restored\nline2"
+    clear_citation_cache()
+
+
+def test_enhance_citations_reads_many_files_once(monkeypatch):
+    """Test the concurrent read path when many files are cited."""
+    files = {f"f{i}.py": f"body{i}\nend" for i in range(5)}
+    reads = []
+    
+    def fake_open_file(repo_id, file_path):
+        reads.append(file_path)
+        if file_path not in files:
+            raise ValueError(f"File not found: {file_path}")
+        return files[file_path]
+    
+    monkeypatch.setattr(citation_service, 'open_file', fake_open_file)
+    clear_citation_cache()
+    
+    citations = [{'file_path': path, 'start_line': 1, 'end_line': 1} for path in list(files) + ['gone.py']]
+    enhanced = CitationService().enhance_citations(citations + citations, 'repo')
+    
+    assert [c['text_snippet'] for c in enhanced] == ([f"body{i}" for i in range(5)] + [SNIPPET_UNAVAILABLE]) * 2
+    assert sorted(reads) == sorted(citation['file_path'] for citation in citations)
+    clear_citation_cache()
+
+
+def test_extract_citations_from_answer_fallback():
+    """Test inferring citations from file mentions when the answer has none."""
+    chunks = [
+        {'file_path': 'src/components/App.tsx', 'start_line': 1, 'end_line': 20},
+        {'file_path': 'src/components/App.tsx', 'start_line': 21, 'end_line': 40},
+        {'metadata': {'file_path': 'api/UserService.java', 'start_line': 5, 'end_line': 9}},
+        {'file_path': 'core/main.py', 'start_line': 1, 'end_line': 3},
+        {'file_path': 'core/other.py', 'start_line': 1, 'end_line': 3},
+        {'file_path': 'lib/main.cpp', 'start_line': 1, 'end_line': 3},
+    ]
+    answer = (
+        "Rendering starts in components/App.tsx, users go through UserService, "
+        "and main.py boots it with lib/main.c."
+    )
+    citations = CitationService().extract_citations_from_answer(answer, chunks)
+    
+    assert [(c['file_path'], c['start_line']) for c in citations] == [
+        ('src/components/App.tsx', 1),
+        ('src/components/App.tsx', 21),
+        ('api/UserService.java', 5),
+        ('core/main.py', 1),
+    ]
+
+
+def test_post_process_answer_is_idempotent():
+    """Test that an already structured answer is returned unchanged."""
+    citations = [{'file_path': 'auth.py', 'start_line': 1, 'end_line': 5, 'text_snippet': 'def login(): pass'}]
+    answer = (
+        "Login is handled in [auth.py:1-5] by the auth module. It checks the password hash first. "
+        "Sessions are then created for the user and stored for later requests."
+    )
+    service = CitationService()
+    structured = service.post_process_answer(answer, citations)
+    
+    assert structured.startswith("**Summary:**")
+    assert "### References:" in structured
+    assert service.post_process_answer(structured, citations) == structured
+
+
+def test_architecture_summary_is_cached(monkeypatch):
+    """Test that successful summaries are reused and failures are retried."""
+    responses = ["Error: Hugging Face API error", "A layered service", "unused"]
+    calls = []
+    
+    class FakeLLMService:
+        def invoke_text(self, prompt, system=None):
+            calls.append(prompt)
+            return responses[len(calls) - 1]
+    
+    monkeypatch.setattr(architecture_service.LLMServiceFactory, 'create_summary_service', lambda: FakeLLMService())
+    service = architecture_service.ArchitectureService()
+    repo = {'repo_id': 'r1', 'commit_hash': 'abc', 'stats': {'total_files': 3}}
+    
+    assert service._generate_llm_summary(repo, ['app.py'], {}) == "Error: Hugging Face API error"
+    assert service._generate_llm_summary(repo, ['app.py'], {}) == "A layered service"
+    assert service._generate_llm_summary(repo, ['app.py'], {}) == "A layered service"
+    assert len(calls) == 2
+    
+    # A new commit gets a fresh summary
+    assert service._generate_llm_summary({**repo, 'commit_hash': 'def'}, ['app.py'], {}) == "unused"
+
+
+def test_iter_sse_deltas():
+    """Test parsing streamed chat completion frames."""
+    lines = [
+        b": keep-alive",
+        b"",
+        'data: {"choices": [{"delta": {"role": "assistant"}}]}'.encode("utf-8"),
+        'data: {"choices": [{"delta": {"content": "caf\u00e9 "}}]}'.encode("utf-8"),
+        b"data: not json",
+        'data: {"choices": [{"delta": {"content": "\u2192 done"}}]}'.encode("utf-8"),
+        b"data: [DONE]",
+        b'data: {"choices": [{"delta": {"content": "ignored"}}]}',
+    ]
+    
+    assert list(_iter_sse_deltas(lines)) == ["caf\u00e9 ", "\u2192 done"]
+
+
+def test_compiled_graphs_are_reused():
+    """Test that graphs are compiled once and rebuilt on request."""
+    rebuild_graphs()
+    graph = create_agent_graph()
+    simple_graph = create_simple_agent_graph()
+    
+    assert create_agent_graph() is graph
+    assert create_simple_agent_graph() is simple_graph
+    assert graph is not simple_graph
+    
+    rebuild_graphs()
+    assert create_agent_graph() is not graph
+
+
+
+def test_synthesize_and_verify():
+    """Test parsing the fused answer-and-verification envelope."""
+    class FakeLLMService:
+        def __init__(self, response):
+            self.response = response
+        
+        def invoke_text(self, prompt, system=None):
+            return self.response
+    
+    response = json.dumps({
+        "answer": "Handled in [auth.py:1-5]",
+        "verification": {"is_grounded": False, "follow_up_queries": "login handler"}
+    })
+    result = _synthesize_and_verify(FakeLLMService(response), "prompt")
+    assert result.answer == "Handled in [auth.py:1-5]"
+    assert result.verification.is_grounded is False
+    assert result.verification.follow_up_queries == ["login handler"]
+    
+    # Malformed verification keeps the answer and accepts it
+    response = json.dumps({"answer": "Handled in [auth.py:1-5]", "verification": "looks fine"})
+    result = _synthesize_and_verify(FakeLLMService(response), "prompt")
+    assert result.answer == "Handled in [auth.py:1-5]"
+    assert result.verification == Verification()
+    
+    # Plain-text answers are kept as the answer
+    result = _synthesize_and_verify(FakeLLMService("Handled in [auth.py:1-5]"), "prompt")
+    assert result == SynthesisWithVerification(answer="Handled in [auth.py:1-5]")
+
+
+def test_get_synthesizer_prompt_formats_chunks():
+    """Test chunk headers for vector (nested metadata) and lexical (flat) results."""
+    chunks = [
+        {'text': 'def login(): pass', 'metadata': {'file_path': 'auth.py', 'start_line': 1, 'end_line': 2, 'symbol_name': 'login'}},
+        {'file_path': 'db.py', 'start_line': 5, 'end_line': 9, 'chunk_text': 'conn = connect()', 'metadata': None},
+    ]
+    prompt = get_synthesizer_prompt("How does login work?", chunks)
+    
+    assert "\n--- Chunk 1: auth.py:1-2 (Symbol: login) ---\ndef login(): pass\n" in prompt
+    assert "\n--- Chunk 2: db.py:5-9 ---\nconn = connect()\n" in prompt
+
+
+def test_get_verifier_prompt_is_stable():
+    """Test that only the draft answer varies, at the end of the verifier prompt."""
+    chunks = [
+        {'file_path': 'b.py', 'start_line': 1, 'end_line': 3, 'text': 'b'},
+        {'metadata': {'file_path': 'a.py', 'start_line': 10, 'end_line': 12}, 'text': 'a'},
+    ]
+    first = get_verifier_prompt("Where is auth?", "Draft one", chunks)
+    retry = get_verifier_prompt("Where is auth?", "Draft two", list(reversed(chunks)))
+    
+    prefix = first[:first.index("Draft one")]
+    assert retry.startswith(prefix)
+    assert prefix.index("Question: Where is auth?") < prefix.index("- a.py:10-12: a...") < prefix.index("- b.py:1-3: b...")
+
+
+def test_structural_verify():
+    """Test the citation-coverage check that can skip the verifier LLM call."""
+    chunks = [
+        {'file_path': 'auth.py', 'start_line': 10, 'end_line': 40},
+        {'metadata': {'file_path': 'app.py', 'start_line': 1, 'end_line': 20}},
+    ]
+    answer = (
+        "Summary:\n"
+        "Tokens are validated by the middleware in [auth.py:12-20]. "
+        "The middleware is registered when the app starts. [app.py:5-6]\n"
+        "It rejects expired tokens with a 401 response [auth.py:30]."
+    )
+    assert _structural_verify(answer, chunks)
+    
+    # Citation outside the retrieved spans
+    assert not _structural_verify(answer.replace("auth.py:30", "auth.py:50"), chunks)
+    
+    # An uncited claim drops coverage below the threshold
+    assert not _structural_verify(answer + " Refresh tokens are stored in Redis for a week.", chunks)
+    
+    # No citations at all
+    assert not _structural_verify("Authentication is handled somewhere in the middleware.", chunks)
+
+
+def test_concurrent_identical_requests_share_one_call(tmp_path, monkeypatch):
+    """Test that concurrent identical deterministic requests make one API call."""
+    calls = []
+    
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+        
+        def json(self):
+            return {"choices": [{"message": {"content": "grounded"}}]}
+    
+    class FakeSession:
+        def post(self, *args, **kwargs):
+            calls.append(kwargs['json'])
+            time.sleep(0.2)
+            return FakeResponse()
+    
+    cache = LLMResponseCache(db_path=tmp_path / "llm_cache.db")
+    monkeypatch.setattr(llm_wrapper, '_SESSION', FakeSession())
+    monkeypatch.setattr(llm_wrapper, 'get_llm_cache', lambda: cache)
+    
+    llm = HuggingFaceChatLLM(model="test-model", api_key="key")
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(llm.invoke("Verify this").content))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert results == ["grounded"] * 3
+    assert len(calls) == 1
+    assert not llm_wrapper._IN_FLIGHT
+
+
+def test_invoke_text_sends_instructions_as_system_message(tmp_path, monkeypatch):
+    """Test that static instructions lead the request as a separate system message."""
+    calls = []
+    
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+        
+        def json(self):
+            return {"choices": [{"message": {"content": "ok"}}]}
+    
+    class FakeSession:
+        def post(self, *args, **kwargs):
+            calls.append(kwargs['json'])
+            return FakeResponse()
+    
+    cache = LLMResponseCache(db_path=tmp_path / "llm_cache.db")
+    monkeypatch.setattr(llm_wrapper, '_SESSION', FakeSession())
+    monkeypatch.setattr(llm_wrapper, 'get_llm_cache', lambda: cache)
+    
+    service = HuggingFaceLLMService(model="test-model")
+    prompt = get_verifier_prompt("Where is auth?", "Draft", [])
+    assert service.invoke_text(prompt, VERIFIER_INSTRUCTIONS) == "ok"
+    
+    assert VERIFIER_INSTRUCTIONS not in prompt
+    assert calls[0]['messages'] == [
+        {"role": "system", "content": VERIFIER_INSTRUCTIONS},
+        {"role": "user", "content": prompt},
+    ]
+
+
+
+def test_stream_events_yields_synthesizer_deltas():
+    """Test that only synthesizer tokens stream, with a restart per re-synthesis."""
+    llm = GenericFakeChatModel(messages=iter([
+        AIMessage(content="plan"),
+        AIMessage(content="Draft one"),
+        AIMessage(content="Draft two"),
+    ]))
+    
+    def planner(state):
+        llm.invoke("plan")
+        return {'reasoning_trace': ["planned"]}
+    
+    def synthesizer(state):
+        answer = llm.invoke(state['question']).content
+        return {'draft_answer': answer, 'retrieval_iteration': state.get('retrieval_iteration', 0) + 1}
+    
+    workflow = StateGraph(AgentState)
+    workflow.add_node("planner", planner)
+    workflow.add_node("synthesizer", synthesizer)
+    workflow.set_entry_point("planner")
+    workflow.add_edge("planner", "synthesizer")
+    workflow.add_conditional_edges(
+        "synthesizer",
+        lambda state: "again" if state['retrieval_iteration'] < 2 else "done",
+        {"again": "synthesizer", "done": END}
+    )
+    graph = workflow.compile()
+    
+    async def collect():
+        return [event async for event in AgentService._stream_events(graph, {'question': "q", 'reasoning_trace': []})]
+    
+    events = asyncio.run(collect())
+    deltas = "".join(event.get('delta', '|') for event in events[:-1])
+    
+    assert deltas == "Draft one|Draft two"
+    assert events[-1]['result']['draft_answer'] == "Draft two"
+    assert events[-1]['result']['reasoning_trace'] == ["planned"]
 
 
 if __name__ == "__main__":
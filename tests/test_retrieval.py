@@ -1,6 +1,11 @@
 """Tests for retrieval tools."""
 import pytest
 from tools.retrieval_tools import extract_keywords, merge_and_rerank
+from core.constants import DEFAULT_MAX_CITATIONS, MAX_QUERY_VARIATIONS
+from core.context_optimizer import optimize_chunks_for_context
+from indexing.chunking import count_tokens
+from agent.nodes import retriever
+from agent.nodes.retriever import _dedupe_queries, _select_top_chunks
 
 
 def test_extract_keywords():
@@ -76,5 +81,79 @@ def test_merge_and_rerank():
     assert all('combined_score' in chunk for chunk in merged)
 
 
+
+def test_dedupe_queries_keeps_every_group():
+    """Test that capping query fan-out never drops a whole base query."""
+    groups = [[f"q {i}", f"q {i} impl", f"q {i} code"] for i in range(6)]
+    groups.append(["rewritten query"])
+    groups[1].append("Q 0?")  # Near-duplicate of the first query
+    
+    unique = _dedupe_queries(groups)
+    
+    assert len(unique) == MAX_QUERY_VARIATIONS
+    assert unique[:6] == [f"q {i}" for i in range(6)]
+    assert "rewritten query" in unique
+    assert "Q 0?" not in unique
+
+
+def test_select_top_chunks():
+    """Test that a strong later chunk displaces a weak earlier one."""
+    existing = [{'chunk_id': f'old{i}', 'combined_score': 0.5} for i in range(DEFAULT_MAX_CITATIONS)]
+    existing[0]['combined_score'] = 0.1
+    new = [{'chunk_id': 'new', 'combined_score': 0.9}]
+    
+    selected = _select_top_chunks(existing + new)
+    
+    assert len(selected) == DEFAULT_MAX_CITATIONS
+    assert selected[0]['chunk_id'] == 'new'
+    assert 'old0' not in {c['chunk_id'] for c in selected}
+    
+    # Under the cap chunks are still returned in score order
+    assert [c['chunk_id'] for c in _select_top_chunks(existing[:2] + new)] == ['new', 'old1', 'old0']
+
+
+def test_retrieve_with_multi_query_keeps_result_fields(monkeypatch):
+    """Test that merging boosts repeated chunks and keeps every result field."""
+    def fake_search_all(queries, repo_id):
+        return [
+            ('auth flow', [{'chunk_id': '1', 'text': 'token check', 'score': 0.4, 'vector_score': 0.7}]),
+            ('login', [{'chunk_id': '1', 'text': 'token check', 'score': 0.4},
+                       {'chunk_id': '2', 'chunk_text': 'unrelated', 'metadata': {'file_path': 'b.py'}}]),
+        ]
+    
+    monkeypatch.setattr(retriever, '_search_all', fake_search_all)
+    results = retriever._retrieve_with_multi_query(['auth flow', 'login'], 'repo', set(), 'token check')
+    
+    assert [c['chunk_id'] for c in results] == ['1', '2']
+    # 0.2 duplicate boost + 0.3 multi-query boost + 2 keyword matches
+    assert results[0]['combined_score'] == pytest.approx(0.2 + 0.3 + 0.2)
+    assert results[0]['query_sources'] == ['auth flow', 'login']
+    assert results[0]['vector_score'] == 0.7  # Unknown keys survive
+    assert results[1]['combined_score'] == 0.5  # Default base score
+    assert results[1]['metadata'] == {'file_path': 'b.py'}
+    
+    # Nested and lexical fields are available as flat keys
+    assert results[1]['file_path'] == 'b.py'
+    assert results[1]['text'] == 'unrelated'
+
+
+
+def test_optimize_chunks_for_context_budget_and_order():
+    """Test greedy packing by priority and file/line ordering of the selection."""
+    chunks = [
+        {'chunk_id': 'low', 'file_path': 'a.py', 'start_line': 1, 'text': 'word ' * 50, 'combined_score': 0.1},
+        {'chunk_id': 'high', 'file_path': 'b.py', 'start_line': 20, 'text': 'word ' * 50, 'combined_score': 0.9},
+        {'chunk_id': 'mid', 'file_path': 'b.py', 'start_line': 5, 'text': 'word ' * 50, 'combined_score': 0.5},
+    ]
+    
+    # Everything fits: all chunks kept, in reading order, without internal fields
+    optimized = optimize_chunks_for_context(chunks, 1000, 0, 0)
+    assert [c['chunk_id'] for c in optimized] == ['low', 'mid', 'high']
+    assert not any('_priority_score' in c or '_token_count' in c for c in optimized)
+    
+    # Room for two full chunks: the lowest priority chunk is dropped
+    optimized = optimize_chunks_for_context(chunks, 2 * count_tokens('word ' * 50), 0, 0)
+    assert [c['chunk_id'] for c in optimized] == ['mid', 'high']
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -1,5 +1,6 @@
 """Retrieval tools for searching code."""
 import re
+from functools import lru_cache
 from typing import List, Dict, Optional
 from indexing.vector_store import get_vector_store
 from indexing.metadata_store import get_metadata_store
@@ -18,6 +19,13 @@ from core.constants import (
     DOC_FILE_PATTERNS
 )
 
+# Shared default for chunks without metadata (never mutated)
+_EMPTY = {}
+
+# Substring patterns folded into one regex each, so a path is scanned once
+_TEST_FILE_PATTERN = re.compile('|'.join(map(re.escape, TEST_FILE_PATTERNS)))
+_DOC_FILE_PATTERN = re.compile('|'.join(map(re.escape, DOC_FILE_PATTERNS)))
+
 
 def expand_query_for_vector_search(question: str) -> str:
     """
@@ -100,20 +108,32 @@ def expand_query_terms(terms: List[str]) -> List[str]:
     expanded = set(terms)
     
     for term in terms:
-        term_lower = term.lower()
-        # Check for exact match in expansions
-        if term_lower in QUERY_EXPANSIONS:
-            expanded.update(QUERY_EXPANSIONS[term_lower])
-        # Check for partial matches (e.g., "auth" in "authentication")
-        else:
-            for key, synonyms in QUERY_EXPANSIONS.items():
-                if key in term_lower or term_lower in key:
-                    expanded.update(synonyms)
-                    expanded.add(key)
+        expanded.update(_term_expansions(term.lower()))
     
     return list(expanded)
 
 
+@lru_cache(maxsize=1024)
+def _term_expansions(term_lower: str) -> tuple:
+    """
+    Related terms for a single lowercased term.
+    
+    Partial matches scan every expansion key, so results are memoized per
+    term; QUERY_EXPANSIONS is read-only, so cached results never go stale.
+    """
+    # Check for exact match in expansions
+    if term_lower in QUERY_EXPANSIONS:
+        return QUERY_EXPANSIONS[term_lower]
+    
+    # Check for partial matches (e.g., "auth" in "authentication")
+    related = []
+    for key, synonyms in QUERY_EXPANSIONS.items():
+        if key in term_lower or term_lower in key:
+            related.extend(synonyms)
+            related.append(key)
+    return tuple(related)
+
+
 def extract_keywords(question: str, expand: bool = True) -> List[str]:
     """
     Extract likely keywords from a question with optional expansion.
@@ -213,14 +233,12 @@ def hybrid_search(question: str, repo_id: str, k: int = 12) -> List[Dict]:
 
 def _is_test_file(file_path: str) -> bool:
     """Check if file is a test file."""
-    file_path_lower = file_path.lower()
-    return any(pattern in file_path_lower for pattern in TEST_FILE_PATTERNS)
+    return _TEST_FILE_PATTERN.search(file_path.lower()) is not None
 
 
 def _is_doc_file(file_path: str) -> bool:
     """Check if file is a documentation file."""
-    file_path_lower = file_path.lower()
-    return any(pattern in file_path_lower for pattern in DOC_FILE_PATTERNS)
+    return _DOC_FILE_PATTERN.search(file_path.lower()) is not None
 
 
 def _calculate_path_depth(file_path: str) -> int:
@@ -326,7 +344,7 @@ def merge_and_rerank(
     results = list(chunk_map.values())
     
     for result in results:
-        file_path = result.get('file_path', result.get('metadata', {}).get('file_path', ''))
+        file_path = result.get('file_path', (result.get('metadata') or _EMPTY).get('file_path', ''))
         chunk_text = result.get('text', result.get('chunk_text', ''))
         
         # Multi-term matching boost
@@ -383,9 +401,10 @@ def deduplicate_by_file_span(results: List[Dict], max_chunks: int = 12) -> List[
     file_spans = {}  # file_path -> list of (start, end, idx)
     
     for result in results:
-        file_path = result.get('file_path', result.get('metadata', {}).get('file_path', ''))
-        start = result.get('start_line', result.get('metadata', {}).get('start_line', 0))
-        end = result.get('end_line', result.get('metadata', {}).get('end_line', 0))
+        metadata = result.get('metadata') or _EMPTY
+        file_path = result.get('file_path', metadata.get('file_path', ''))
+        start = result.get('start_line', metadata.get('start_line', 0))
+        end = result.get('end_line', metadata.get('end_line', 0))
         
         if not file_path:
             kept.append(result)